@@ -0,0 +1,310 @@
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix, csr_matrix
+    from scipy.sparse.csgraph import connected_components, min_weight_full_bipartite_matching
+except ImportError:
+    linear_sum_assignment = None
+
+
+# clusters with more track and detection pairs than this are solved on their sparse gated pairs
+DENSE_CLUSTER_SIZE = 1 << 20
+
+
+class UniformGrid:
+    def __init__(self, locations, cell_size):
+        self.locations = np.asarray(locations, dtype=float).reshape(-1, 3)  # [M, 3]
+        self.cell_size = cell_size if np.isfinite(cell_size) and cell_size > 0 else np.inf
+        self.alive = np.ones(self.locations.shape[0], dtype=bool)
+        self.pair_num = 0  # the number of distances evaluated through this grid
+
+        self.cells = {}
+        self.keys = np.zeros((0, 3), dtype=np.int64)
+        self.key_min = np.zeros(3, dtype=np.int64)
+        self.key_max = np.full(3, -1, dtype=np.int64)
+        if self.locations.shape[0] > 0:
+            keys, inverse = np.unique(self.get_cells(self.locations), axis=0, return_inverse=True)
+            order = np.argsort(inverse.reshape(-1), kind='stable')
+            splits = np.cumsum(np.bincount(inverse.reshape(-1)))[:-1]
+            for key, indices in zip(map(tuple, keys), np.split(order, splits)):
+                self.cells[key] = indices
+            self.keys = keys
+            self.key_min = keys.min(axis=0)
+            self.key_max = keys.max(axis=0)
+
+    def __len__(self):
+        return self.locations.shape[0]
+
+    def get_cells(self, locations):
+        if np.isinf(self.cell_size):
+            return np.zeros((locations.shape[0], 3), dtype=np.int64)
+        return np.floor(locations / self.cell_size).astype(np.int64)
+
+    def query(self, x, y, z, r):
+        center = self.get_cells(np.array([[x, y, z]]))[0]
+        span = 0 if np.isinf(self.cell_size) else int(np.ceil(r / self.cell_size))
+
+        # the query box is clipped to the bounds of the occupied cells
+        lower = np.maximum(center - span, self.key_min).tolist()
+        upper = np.minimum(center + span, self.key_max).tolist()
+        if any(u < l for l, u in zip(lower, upper)):
+            return np.zeros(0, dtype=np.int64)
+        candidates = []
+        if (upper[0] - lower[0] + 1) * (upper[1] - lower[1] + 1) * (upper[2] - lower[2] + 1) > len(self.cells):
+            # scan the occupied cells when the query box covers more cells than exist
+            near = np.all(np.abs(self.keys - center) <= span, axis=1)
+            for key in map(tuple, self.keys[near]):
+                candidates.append(self.cells[key])
+        else:
+            for i in range(lower[0], upper[0] + 1):
+                for j in range(lower[1], upper[1] + 1):
+                    for k in range(lower[2], upper[2] + 1):
+                        indices = self.cells.get((i, j, k))
+                        if indices is not None:
+                            candidates.append(indices)
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.sort(np.concatenate(candidates))
+        return candidates[self.alive[candidates]]
+
+    def get_distances(self, x, y, z, gate, ss_inv=None, radius=None):
+        candidates = self.query(x, y, z, gate if radius is None else radius)
+        self.pair_num += candidates.size
+        zs = self.locations[candidates]
+        if ss_inv is None:
+            dd = ((x - zs[:, 0]) ** 2 + (y - zs[:, 1]) ** 2 + (z - zs[:, 2]) ** 2) ** 0.5
+        else:
+            dd = get_mahalanobis_distances(zs - np.array([x, y, z]), ss_inv)
+        return candidates, dd
+
+    def find_nearest(self, x, y, z, gate, ss_inv=None, radius=None):
+        candidates, dd = self.get_distances(x, y, z, gate, ss_inv, radius)
+        if candidates.size == 0:
+            return False, 0, float('inf')
+        k = int(np.argmin(dd))
+        if dd[k] < gate:
+            return True, int(candidates[k]), float(dd[k])
+        return False, 0, float('inf')
+
+    def remove(self, idx):
+        self.alive[idx] = False
+
+
+def get_search_radii(ss_inv, gate):
+    # the euclidean radius which contains the whole mahalanobis gate of each track
+    return gate / np.linalg.eigvalsh(ss_inv)[:, 0] ** 0.5
+
+
+def get_mahalanobis_distances(innovations, ss_inv):
+    return np.einsum('...i,...ij,...j->...', innovations, ss_inv, innovations) ** 0.5
+
+
+def associate_greedy(locations, grid, gate, ss_inv=None):
+    # match tracks in order, each to its nearest remaining detection inside the gate
+    locations = np.asarray(locations, dtype=float).reshape(-1, 3)
+    radii = None if ss_inv is None else get_search_radii(ss_inv, gate)
+    indices = []
+    for j, (x, y, z) in enumerate(locations):
+        if ss_inv is None:
+            flag, idx, _ = grid.find_nearest(x, y, z, gate)
+        else:
+            flag, idx, _ = grid.find_nearest(x, y, z, gate, ss_inv[j], radii[j])
+        if flag:
+            grid.remove(idx)
+        indices.append(idx if flag else -1)
+    return indices
+
+
+def group_by_label(labels):
+    order = np.argsort(labels, kind='stable')
+    splits = np.flatnonzero(np.diff(labels[order])) + 1
+    groups = np.split(order, splits) if order.size > 0 else []
+    return {int(labels[group[0]]): group for group in groups}
+
+
+def get_pair_clusters(n, m, rows, cols):
+    # split the gated bipartite graph into independent groups of tracks and detections
+    graph = coo_matrix((np.ones(rows.size), (rows, n + cols)), shape=(n + m, n + m))
+    _, labels = connected_components(graph, directed=False)
+    track_groups = group_by_label(labels[:n])
+    det_groups = group_by_label(labels[n:])
+    clusters = []
+    for label, tracks in track_groups.items():
+        if label in det_groups:
+            clusters.append((tracks, det_groups[label]))
+    return clusters
+
+
+def solve_cluster(dd, gated, infeasible):
+    if dd.shape[0] == 1 or dd.shape[1] == 1:
+        k = np.unravel_index(np.argmin(np.where(gated, dd, np.inf)), dd.shape)
+        rows, cols = [k[0]], [k[1]]
+    else:
+        rows, cols = linear_sum_assignment(np.where(gated, dd, infeasible))
+    return [(r, c) for r, c in zip(rows, cols) if gated[r, c]]
+
+
+def solve_sparse_cluster(n, m, rows, cols, dists, infeasible):
+    # every track has its own miss column at the infeasible cost, as the dense solver pays for a miss, so that all
+    # tracks can be matched, the weights are shifted by one to stay nonzero, which adds n to every full matching
+    data = np.concatenate([dists, np.full(n, infeasible)]) + 1
+    rows = np.concatenate([rows, np.arange(n)])
+    cols = np.concatenate([cols, m + np.arange(n)])
+    _, matched = min_weight_full_bipartite_matching(csr_matrix((data, (rows, cols)), shape=(n, m + n)))
+    real = np.flatnonzero(matched < m)
+    return list(zip(real, matched[real]))
+
+
+def get_gated_pairs(locations, grid, gate, ss_inv=None):
+    # all remaining track and detection pairs inside the gate, as track indices, detection indices and distances
+    locations = np.asarray(locations, dtype=float).reshape(-1, 3)
+    radii = None if ss_inv is None else get_search_radii(ss_inv, gate)
+    tracks, dets, dists = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    for j, (x, y, z) in enumerate(locations):
+        if ss_inv is None:
+            candidates, dd = grid.get_distances(x, y, z, gate)
+        else:
+            candidates, dd = grid.get_distances(x, y, z, gate, ss_inv[j], radii[j])
+        mask = dd < gate
+        tracks.append(np.full(int(mask.sum()), j, dtype=np.int64))
+        dets.append(candidates[mask])
+        dists.append(dd[mask])
+    return np.concatenate(tracks), np.concatenate(dets), np.concatenate(dists)
+
+
+def assign_pairs(tracks, dets, dists, track_num, gate, association='greedy'):
+    # the same result as associate_greedy or associate_global, computed from the gated pairs alone
+    indices = np.full(track_num, -1, dtype=np.int64)
+    if tracks.size == 0:
+        return indices
+    if association == 'greedy':
+        taken = set()
+        for k in np.lexsort((dets, dists, tracks)):
+            if indices[tracks[k]] < 0 and dets[k] not in taken:
+                indices[tracks[k]] = dets[k]
+                taken.add(dets[k])
+        return indices
+
+    if linear_sum_assignment is None:
+        raise ImportError('global association requires scipy')
+    infeasible = 1e6 * (gate if np.isfinite(gate) else dists.max() + 1)
+    for cluster_tracks, cluster_dets, pairs, rows, cols in get_pair_cluster_blocks(track_num, tracks, dets):
+        if cluster_tracks.size * cluster_dets.size > DENSE_CLUSTER_SIZE:
+            matches = solve_sparse_cluster(cluster_tracks.size, cluster_dets.size, rows, cols, dists[pairs], infeasible)
+        else:
+            dd = np.full((cluster_tracks.size, cluster_dets.size), np.inf)
+            dd[rows, cols] = dists[pairs]
+            matches = solve_cluster(dd, dd < np.inf, infeasible)
+        for r, c in matches:
+            indices[cluster_tracks[r]] = cluster_dets[c]
+    return indices
+
+
+def get_pair_cluster_blocks(track_num, tracks, dets):
+    # the clusters of gated pairs as their tracks, their detections, the pairs inside,
+    # and the rows and columns of these pairs in the matrix of the cluster
+    columns, cols = np.unique(dets, return_inverse=True)
+    cols = cols.reshape(-1)
+    clusters = get_pair_clusters(track_num, columns.size, tracks, cols)
+    rows_map = np.zeros(track_num, dtype=np.int64)
+    cols_map = np.zeros(columns.size, dtype=np.int64)
+    labels = np.zeros(track_num, dtype=np.int64)
+    for label, (cluster_tracks, cluster_cols) in enumerate(clusters):
+        rows_map[cluster_tracks] = np.arange(cluster_tracks.size)
+        cols_map[cluster_cols] = np.arange(cluster_cols.size)
+        labels[cluster_tracks] = label
+    pair_groups = group_by_label(labels[tracks])
+    blocks = []
+    for label, (cluster_tracks, cluster_cols) in enumerate(clusters):
+        pairs = pair_groups[label]
+        blocks.append((cluster_tracks, columns[cluster_cols], pairs, rows_map[tracks[pairs]], cols_map[cols[pairs]]))
+    return blocks
+
+
+def associate_global(locations, grid, gate, ss_inv=None):
+    # minimize the total distance of all matches inside the gate, solving each cluster of gated pairs separately
+    if linear_sum_assignment is None:
+        raise ImportError('global association requires scipy')
+    locations = np.asarray(locations, dtype=float).reshape(-1, 3)
+    tracks, dets, dists = get_gated_pairs(locations, grid, gate, ss_inv)
+    indices = assign_pairs(tracks, dets, dists, locations.shape[0], gate, 'global')
+    grid.remove(indices[indices >= 0])
+    return indices.tolist()
+
+
+def get_pair_log_likelihoods(innovations, ss_inv, logdet):
+    # the gaussian log densities of the innovations of gated pairs, innovations: [P, 3]
+    d2 = np.einsum('pi,pij,pj->p', innovations, ss_inv, innovations)
+    return -0.5 * (d2 + logdet + 3 * np.log(2 * np.pi))
+
+
+def enumerate_events(options, max_hypotheses):
+    # all joint events of a cluster as [E, n] detection columns of every track, -1 means missed,
+    # None if the number of events exceeds max_hypotheses
+    events = np.zeros((1, 0), dtype=np.int64)
+    for cols in options:
+        choices = np.concatenate([[-1], cols])
+        events = np.concatenate([np.repeat(events, choices.size, axis=0),
+                                 np.tile(choices, events.shape[0])[:, None]], axis=1)
+        used = (events[:, -1] >= 0) & (events[:, :-1] == events[:, -1:]).any(axis=1)
+        events = events[~used]
+        if events.shape[0] > max_hypotheses:
+            return None
+    return events
+
+
+def get_jpda_weights(gains, miss_gain, max_hypotheses):
+    # gains: [n, m] log gains of assigning detections to tracks, -inf outside the gate
+    # returns [n, m] association probabilities, the rest of each row is the probability of a miss
+    n, m = gains.shape
+    options = [np.flatnonzero(np.isfinite(row)) for row in gains]
+    events = enumerate_events(options, max_hypotheses)
+    if events is None:
+        # too many joint events, the cheap jpda approximation of fitzgerald is used instead
+        scale = max(gains[np.isfinite(gains)].max(), miss_gain)
+        gg = np.exp(gains - scale)
+        bb = np.exp(miss_gain - scale)
+        weights = gg / (gg.sum(axis=1, keepdims=True) + gg.sum(axis=0, keepdims=True) - gg + bb)
+        total = weights.sum(axis=1, keepdims=True)
+        return weights / np.maximum(total, 1.0)
+
+    extended = np.concatenate([gains, np.full((n, 1), miss_gain)], axis=1)  # the last column is the miss
+    cols = np.where(events >= 0, events, m)
+    logs = extended[np.arange(n), cols].sum(axis=1)
+    probs = np.exp(logs - logs.max())
+    probs /= probs.sum()
+    flat = (np.arange(n) * (m + 1) + cols).reshape(-1)
+    weights = np.bincount(flat, weights=np.repeat(probs, n), minlength=n * (m + 1)).reshape(n, m + 1)
+    return weights[:, :m]
+
+
+def associate_jpda(locations, grid, gate, ss, ss_inv, mahalanobis=False, detection_prob=0.9,
+                   clutter_density=1e-3, max_hypotheses=10000):
+    # joint probabilistic data association, solving each cluster of the gated pairs separately
+    # returns the most probable detection of each track and the gated pairs with their probabilities
+    locations = np.asarray(locations, dtype=float).reshape(-1, 3)
+    n = locations.shape[0]
+    indices = np.full(n, -1, dtype=np.int64)
+    tracks, dets, _ = get_gated_pairs(locations, grid, gate, ss_inv if mahalanobis else None)
+    if tracks.size == 0:
+        return indices.tolist(), (tracks, dets, np.zeros(0))
+
+    _, logdet = np.linalg.slogdet(ss)
+    loglik = get_pair_log_likelihoods(grid.locations[dets] - locations[tracks], ss_inv[tracks], logdet[tracks])
+    gains = np.log(detection_prob) + loglik - np.log(clutter_density)
+    miss_gain = np.log(1 - detection_prob)
+
+    weights = np.zeros(tracks.size)
+    for cluster_tracks, cluster_dets, pairs, rows, cols in get_pair_cluster_blocks(n, tracks, dets):
+        gg = np.full((cluster_tracks.size, cluster_dets.size), -np.inf)
+        gg[rows, cols] = gains[pairs]
+        beta = get_jpda_weights(gg, miss_gain, max_hypotheses)
+        weights[pairs] = beta[rows, cols]
+
+        # the most probable detection of each track, unless a miss is more probable
+        best = np.argmax(beta, axis=1)
+        hit = beta[np.arange(best.size), best] > 1 - beta.sum(axis=1)
+        indices[cluster_tracks[hit]] = cluster_dets[best[hit]]
+    grid.remove(indices[indices >= 0])
+    return indices.tolist(), (tracks, dets, weights)
@@ -0,0 +1,147 @@
+import argparse
+import json
+import platform
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+import tracker_utils
+import simulation_utils
+import metrics_utils
+
+
+ITER_NUM = 200  # the number of iterations
+TIME_INTERVAL = 0.1  # the time interval between frames, second
+SIGMA_AX = 1
+SIGMA_AY = 1
+SIGMA_AZ = 0.01
+SIGMA_OX = 0.1
+SIGMA_OY = 0.1
+SIGMA_OZ = 0.001
+SIGMA_VL = 1
+SIGMA_VW = 1
+SIGMA_VH = 1
+SEED = 0
+EGO_YAW_RATE = 0.1  # the yaw rate of the moving ego vehicle, rad/s
+BASE_SCENE = dict(target_num=300, detect_range=150, clutter_rate=0, gate=10, ego_speed=0)
+SWEEPS = dict(
+    target_num=[100, 300, 1000, 3000],
+    detect_range=[75, 150, 300],
+    clutter_rate=[0, 20, 100],
+    gate=[5, 10, 20],
+    ego_speed=[0, 10, 30],
+)
+TRACKER_CONFIGS = [
+    dict(association='greedy'),
+    dict(association='global'),
+    dict(association='greedy', filter_bank=True),
+    dict(association='global', filter_bank=True),
+    dict(association='greedy', filter_bank=True, gating='mahalanobis'),
+    dict(association='jpda', filter_bank=True, gating='mahalanobis'),
+]
+STAGES = dict(
+    predict=['ego', 'predict'],
+    associate=['index', 'associate'],
+    update=['update'],
+    birth_death=['delete', 'birth', 'candidate', 'shed'],
+)
+
+
+def generate_frames(scene, iter_num, seed):
+    engine = simulation_utils.SimulationEngine(
+        scene['target_num'], TIME_INTERVAL, SIGMA_AX, SIGMA_AY, SIGMA_AZ, SIGMA_VL, SIGMA_VW, SIGMA_VH,
+        SIGMA_OX, SIGMA_OY, SIGMA_OZ, scene['detect_range'], rng=np.random.default_rng(seed),
+        clutter_rate=scene['clutter_rate'], ego_velocity=(scene['ego_speed'], 0, 0),
+        ego_yaw_rate=EGO_YAW_RATE if scene['ego_speed'] > 0 else 0)
+    return list(engine.generate_posed_frames(iter_num))
+
+
+def build_tracker(scene, config, metrics=None):
+    return tracker_utils.MultipleTargetTracker(
+        TIME_INTERVAL, SIGMA_AX, SIGMA_AY, SIGMA_AZ, SIGMA_OX, SIGMA_OY, SIGMA_OZ, scene['gate'],
+        metrics=metrics, **config)
+
+
+def run_tracker(scene, config, frames):
+    metrics = metrics_utils.TrackerMetrics(history=len(frames))
+    tracker = build_tracker(scene, config, metrics)
+    for detections, ego_pose in frames:
+        tracker.update_arrays(detections, ego_pose=ego_pose)
+
+    # measure the peak memory in a separate pass, tracemalloc slows down every allocation
+    tracker = build_tracker(scene, config)
+    tracemalloc.start()
+    for detections, ego_pose in frames:
+        tracker.update_arrays(detections, ego_pose=ego_pose)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = dict(frame=[frame.total_time for frame in metrics.frames])
+    for stage, names in STAGES.items():
+        latencies[stage] = [sum(frame.stage_times.get(name, 0.0) for name in names) for frame in metrics.frames]
+    summary = metrics.get_summary()
+    result = dict(
+        frames_per_second=len(frames) / sum(latencies['frame']),
+        peak_memory_bytes=peak,
+        confirmed_num=len(tracker.get_confirmed_objects()),
+        tracked_num=tracker.tracked_num,
+        pair_num=summary['pair_num'],
+        gate_hit_num=summary['gate_hit_num'],
+        gate_miss_num=summary['gate_miss_num'],
+        birth_num=summary['birth_num'],
+        death_num=summary['death_num'],
+    )
+    for stage, values in latencies.items():
+        values = np.array(values) * 1000
+        result['%s_ms' % stage] = dict(
+            mean=float(values.mean()),
+            p50=float(np.percentile(values, 50)),
+            p90=float(np.percentile(values, 90)),
+            p99=float(np.percentile(values, 99)),
+        )
+    return result
+
+
+def get_version():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Headless throughput benchmark of MultipleTargetTracker')
+    parser.add_argument('--iter_num', type=int, default=ITER_NUM, help='the number of frames per scene')
+    parser.add_argument('--sweeps', nargs='+', default=list(SWEEPS), choices=list(SWEEPS),
+                        help='the scene parameters to sweep')
+    parser.add_argument('--output', default='bench_output.json', help='the file to save results to')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = []
+    for name in args.sweeps:
+        for value in SWEEPS[name]:
+            scene = dict(BASE_SCENE, **{name: value})
+            frames = generate_frames(scene, args.iter_num, SEED)
+            detection_num = float(np.mean([len(detections) for detections, _ in frames]))
+            print('Sweep %s = %s, detections per frame: %.1f' % (name, value, detection_num))
+            for config in TRACKER_CONFIGS:
+                result = run_tracker(scene, config, frames)
+                results.append(dict(sweep=name, scene=scene, tracker=config, detection_num=detection_num, **result))
+                print('\t%-75s %8.1f frames/s  p99 %7.2f ms  peak %7.1f MB' % (
+                    config, result['frames_per_second'], result['frame_ms']['p99'],
+                    result['peak_memory_bytes'] / 2 ** 20))
+
+    report = dict(
+        version=get_version(),
+        python=platform.python_version(),
+        numpy=np.__version__,
+        iter_num=args.iter_num,
+        results=results,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('\nResults saved to %s' % args.output)
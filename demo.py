@@ -1,4 +1,8 @@
+import argparse
+
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib import animation
 
 import tracker_utils
 import simulation_utils
@@ -25,17 +29,90 @@ SIGMA_VH = 1
 PLOT_RANGE = [-100, -100, -100, 100, 100, 100]
 
 
+def draw_legacy(ax, boxes_observed, objs):
+    ax.clear()
+    
+    # draw the ego vehicle
+    ax.scatter([EGO_LOCATION[0]], [EGO_LOCATION[1]], [EGO_LOCATION[2]], c='blue', s=20)
+    
+    # draw the range of detection
+    xs, ys, zs = plot_utils.get_circle(EGO_LOCATION[0], EGO_LOCATION[1], EGO_LOCATION[2], DETECT_RANGE)
+    ax.plot(xs, ys, zs, '--', c='gray', linewidth=1)
+
+    # draw the observation
+    num = len(boxes_observed)
+    for j in range(num):
+        x0, y0, z0, length, width, height = boxes_observed[j]
+        xs, ys, zs, filled = plot_utils.get_voxel(x0, y0, z0, length, width, height)
+        ax.voxels(xs, ys, zs, filled, edgecolors='gray', linewidth=0.1, facecolors='gray', alpha=0.5)
+
+    # draw estimated targets and the association gates
+    num = len(objs)
+    for j in range(num):
+        obj = objs[j]
+        x0, y0, z0, length, width, height = obj.get_box()
+        xs, ys, zs, filled = plot_utils.get_voxel(x0, y0, z0, length, width, height)
+        ax.voxels(xs, ys, zs, filled, edgecolors='red', linewidth=0.1, facecolors='red', alpha=0.5)
+
+        xs, ys, zs = plot_utils.get_circle(x0, y0, z0, GATE)
+        ax.plot(xs, ys, zs, '--', c='red', linewidth=1)
+
+        text_id = str(objs[j].number)
+        ax.text(x0 + length / 2, y0 + width / 2, z0 + height / 2, text_id, color='black', fontsize=6)
+    
+    # close the drawing window after showing for a while
+    xmin, ymin, zmin, xmax, ymax, zmax = PLOT_RANGE
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    ax.set_zlim(zmin, zmax)
+    ax.tick_params(labelsize=8)
+    ax.set_xlabel('X (m)', fontsize=8)
+    ax.set_ylabel('Y (m)', fontsize=8)
+    ax.set_zlabel('Z (m)', fontsize=8)
+    ax.view_init(elev=45, azim=-135)
+    plt.pause(0.02)
+
+
+def get_video_writer(fps):
+    if animation.writers.is_available('ffmpeg'):
+        return animation.FFMpegWriter(fps=fps)
+    return animation.PillowWriter(fps=fps)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulation and tracking demo of MultipleTargetTracker')
+    parser.add_argument('--iter_num', type=int, default=ITER_NUM, help='the number of iterations')
+    parser.add_argument('--render', default='blit', choices=['blit', 'legacy'],
+                        help='blit updates persistent artists, legacy redraws the whole scene every frame')
+    parser.add_argument('--video', default=None, help='the file to write frames to headlessly instead of a window')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
+    args = parse_args()
+    if args.video is not None:
+        plt.switch_backend('Agg')
     fig = plt.figure(figsize=(7, 5.5))
     ax = fig.add_subplot(projection='3d')
+
+    # the legacy mode rebuilds every artist, the others keep them and only update their geometry
+    writer, renderer = None, None
+    if args.video is not None:
+        writer = get_video_writer(fps=1 / TIME_INTERVAL)
+        writer.setup(fig, args.video, dpi=100)
+    if args.render == 'blit' or writer is not None:
+        renderer = plot_utils.SceneRenderer(
+            fig, ax, PLOT_RANGE, EGO_LOCATION, DETECT_RANGE, GATE, blit=writer is None, writer=writer)
+        if writer is None:
+            plt.show(block=False)
     objs, objs_temp = [], []
     number = 0  # tracking ID
-    targets = simulation_utils.init_targets(TARGET_NUM, ITER_NUM)  # [9 * target_num, iter_num]
+    targets = simulation_utils.init_targets(TARGET_NUM, args.iter_num)  # [9 * target_num, iter_num]
     tracker = tracker_utils.MultipleTargetTracker(
         TIME_INTERVAL, SIGMA_AX, SIGMA_AY, SIGMA_AZ, SIGMA_OX, SIGMA_OY, SIGMA_OZ,
         GATE, BLIND_UPDATE_LIMIT, CONFIRMATION_THRESH)
 
-    for i in range(ITER_NUM):
+    for i in range(args.iter_num):
         print('Iteration:', i + 1)
         
         # control targets' state and shape randomly
@@ -47,18 +124,17 @@ if __name__ == '__main__':
             targets[9 * j + 6:9 * j + 9, i + 1] = simulation_utils.control_target_shape(
                 shape, SIGMA_VL, SIGMA_VW, SIGMA_VH).reshape(3)
 
-        # get the observed list
-        objs_observed = []
+        # get the observed boxes
+        boxes_observed = []
         for j in range(TARGET_NUM):
             target = targets[9 * j:9 * j + 9, i + 1]
             state, shape = simulation_utils.observe(target, DETECT_RANGE, SIGMA_OX, SIGMA_OY, SIGMA_OZ)
             if state is not None and shape is not None:
-                x, y, z, l, w, h = state[0, 0], state[1, 0], state[2, 0], shape[0, 0], shape[1, 0], shape[2, 0]
-                obj = tracker_utils.Object(x, y, z, l, w, h)
-                objs_observed.append(obj)
+                boxes_observed.append([state[0, 0], state[1, 0], state[2, 0], shape[0, 0], shape[1, 0], shape[2, 0]])
+        boxes_observed = np.array(boxes_observed).reshape(-1, 6)  # [M, 6]
 
         # get the tracked list
-        tracker.update_objects(objs_observed)
+        tracks = tracker.update_arrays(boxes_observed)
         objs = tracker.get_confirmed_objects()
 
         for j in range(len(objs)):
@@ -68,49 +144,13 @@ if __name__ == '__main__':
             print()
         
         # draw dynamically
-        ax.clear()
-        
-        # draw the ego vehicle
-        ax.scatter([EGO_LOCATION[0]], [EGO_LOCATION[1]], [EGO_LOCATION[2]], c='blue', s=20)
-        
-        # draw the range of detection
-        xs, ys, zs = plot_utils.get_circle(EGO_LOCATION[0], EGO_LOCATION[1], EGO_LOCATION[2], DETECT_RANGE)
-        ax.plot(xs, ys, zs, '--', c='gray', linewidth=1)
-
-        # draw the observation
-        num = len(objs_observed)
-        for j in range(num):
-            obj = objs_observed[j]
-            x0, y0, z0, length, width, height = obj.get_box()
-            xs, ys, zs, filled = plot_utils.get_voxel(x0, y0, z0, length, width, height)
-            ax.voxels(xs, ys, zs, filled, edgecolors='gray', linewidth=0.1, facecolors='gray', alpha=0.5)
-
-        # draw estimated targets and the association gates
-        num = len(objs)
-        for j in range(num):
-            obj = objs[j]
-            x0, y0, z0, length, width, height = obj.get_box()
-            xs, ys, zs, filled = plot_utils.get_voxel(x0, y0, z0, length, width, height)
-            ax.voxels(xs, ys, zs, filled, edgecolors='red', linewidth=0.1, facecolors='red', alpha=0.5)
-
-            xs, ys, zs = plot_utils.get_circle(x0, y0, z0, GATE)
-            ax.plot(xs, ys, zs, '--', c='red', linewidth=1)
-
-            text_id = str(objs[j].number)
-            ax.text(x0 + length / 2, y0 + width / 2, z0 + height / 2, text_id, color='black', fontsize=6)
-        
-        # close the drawing window after showing for a while
-        xmin, ymin, zmin, xmax, ymax, zmax = PLOT_RANGE
-        ax.set_xlim(xmin, xmax)
-        ax.set_ylim(ymin, ymax)
-        ax.set_zlim(zmin, zmax)
-        ax.tick_params(labelsize=8)
-        ax.set_xlabel('X (m)', fontsize=8)
-        ax.set_ylabel('Y (m)', fontsize=8)
-        ax.set_zlabel('Z (m)', fontsize=8)
-        ax.view_init(elev=45, azim=-135)
-        plt.pause(0.02)
-        if len(plt.get_fignums()) == 0:
+        if renderer is not None:
+            renderer.update(boxes_observed, tracks)
+        else:
+            draw_legacy(ax, boxes_observed, objs)
+        if writer is None and len(plt.get_fignums()) == 0:
             break
-            
+
+    if writer is not None:
+        writer.finish()
     print("\nSimulation process finished!")
@@ -1,6 +1,42 @@
+import functools
+
 import numpy as np
 
 
+def get_dt_key(dt):
+    # jittered intervals share the cached matrices of the same microsecond
+    return round(float(dt), 6)
+
+
+@functools.lru_cache(maxsize=64)
+def get_transition_matrices(dt, sigmas_a):
+    # the constant velocity transition and process noise over dt, states are ordered as x, vx, y, vy, ...
+    n = len(sigmas_a)
+    ff = np.eye(2 * n)
+    noise_q = np.zeros((2 * n, 2 * n))
+    for k in range(n):
+        gg = np.array([[0.5 * dt ** 2], [dt]])
+        noise_q[2 * k:2 * k + 2, 2 * k:2 * k + 2] = gg @ gg.T * sigmas_a[k] ** 2
+        ff[2 * k, 2 * k + 1] = dt
+    ff.setflags(write=False)
+    noise_q.setflags(write=False)
+    return ff, noise_q
+
+
+@functools.lru_cache(maxsize=64)
+def get_noise_blocks(dt, sigmas_a):
+    # the 2x2 process noise blocks of every axis as q00, q01 and q11
+    n = len(sigmas_a)
+    flat, step = get_transition_matrices(dt, sigmas_a)[1].reshape(-1), 2 * (2 * n + 1)
+    return flat[0:n * step:step], flat[1:n * step:step], flat[2 * n + 1:2 * n + 1 + n * step:step]
+
+
+def get_frame_transform(rotation, translation, order=2):
+    # moves states ordered as x, vx, ..., y, vy, ... into another frame, all derivatives are rotated
+    eye = np.eye(order)
+    return np.kron(rotation, eye), np.kron(translation, eye[0])
+
+
 class KalmanFilter2D:
     def __init__(self, dt, x, vx, sigma_ax=1, sigma_ox=1):
         self.dt = dt
@@ -98,6 +134,7 @@ class KalmanFilter4D:
 class KalmanFilter6D:
     def __init__(self, dt, x, vx, y, vy, z, vz, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1):
         self.dt = dt
+        self.sigmas_a = (sigma_ax, sigma_ay, sigma_az)
         gg = np.array([[0.5 * self.dt ** 2, 0, 0],
                        [self.dt, 0, 0],
                        [0, 0.5 * self.dt ** 2, 0],
@@ -128,9 +165,15 @@ class KalmanFilter6D:
                             [0, 0, 1, 0, 0, 0],
                             [0, 0, 0, 0, 1, 0]])
 
-    def predict(self):
-        self.xx = self.ff @ self.xx
-        self.pp = self.ff @ self.pp @ self.ff.T + self.noise_q
+    def get_transition_matrices(self, dt=None):
+        if dt is None or dt == self.dt:
+            return self.ff, self.noise_q
+        return get_transition_matrices(get_dt_key(dt), self.sigmas_a)
+
+    def predict(self, dt=None):
+        ff, noise_q = self.get_transition_matrices(dt)
+        self.xx = ff @ self.xx
+        self.pp = ff @ self.pp @ ff.T + noise_q
 
     def update(self, zx, zy, zz):
         zs = np.array([[zx],
@@ -158,3 +201,648 @@ class KalmanFilter6D:
         self.xx[3, 0] = vy
         self.xx[4, 0] = z
         self.xx[5, 0] = vz
+
+
+class KalmanFilterBank6D:
+    def __init__(self, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1, capacity=16):
+        self.dt = dt
+        self.sigmas = (sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+        template = KalmanFilter6D(dt, 0, 0, 0, 0, 0, 0, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+        self.noise_q = template.noise_q
+        self.noise_r = template.noise_r
+        self.pp0 = template.pp
+        self.ff = template.ff
+        self.hh = template.hh
+
+        self.num = 0
+        self.buffer_xx = np.zeros((capacity, 6))  # [capacity, 6]
+        self.buffer_pp = np.zeros((capacity, 6, 6))  # [capacity, 6, 6]
+        self.filters = []
+
+        # innovation covariances shared by gating and update, cleared whenever a state changes
+        self.ss = None  # [N, 3, 3]
+        self.ss_inv = None  # [N, 3, 3]
+
+    @property
+    def xx(self):
+        return self.buffer_xx[:self.num]  # [N, 6]
+
+    @property
+    def pp(self):
+        return self.buffer_pp[:self.num]  # [N, 6, 6]
+
+    def __len__(self):
+        return self.num
+
+    def reserve(self, capacity):
+        if capacity > self.buffer_xx.shape[0]:
+            capacity = max(capacity, 2 * self.buffer_xx.shape[0])
+            buffer_xx = np.zeros((capacity, 6))
+            buffer_pp = np.zeros((capacity, 6, 6))
+            buffer_xx[:self.num] = self.xx
+            buffer_pp[:self.num] = self.pp
+            self.buffer_xx, self.buffer_pp = buffer_xx, buffer_pp
+
+    def add(self, x, vx, y, vy, z, vz, pp=None):
+        self.reserve(self.num + 1)
+        self.buffer_xx[self.num] = x, vx, y, vy, z, vz
+        self.buffer_pp[self.num] = self.pp0 if pp is None else pp
+        self.ss, self.ss_inv = None, None
+        view = KalmanFilterView6D(self, self.num)
+        self.filters.append(view)
+        self.num += 1
+        return view
+
+    def remove(self, keep):
+        keep = np.asarray(keep, dtype=bool).reshape(self.num)
+        num = int(keep.sum())
+        filters = []
+        for view, k in zip(self.filters, keep):
+            if k:
+                view.idx = len(filters)
+                filters.append(view)
+            else:
+                view.detach()
+        self.buffer_xx[:num] = self.xx[keep]
+        self.buffer_pp[:num] = self.pp[keep]
+        self.filters = filters
+        self.num = num
+        self.ss, self.ss_inv = None, None
+
+    def reorder(self, order):
+        order = np.asarray(order, dtype=int).reshape(self.num)
+        self.buffer_xx[:self.num] = self.xx[order]
+        self.buffer_pp[:self.num] = self.pp[order]
+        self.filters = [self.filters[k] for k in order]
+        for idx, view in enumerate(self.filters):
+            view.idx = idx
+        self.ss, self.ss_inv = None, None
+
+    def get_transition_matrices(self, dt=None):
+        if dt is None or dt == self.dt:
+            return self.ff, self.noise_q
+        return get_transition_matrices(get_dt_key(dt), self.sigmas[:3])
+
+    def predict(self, indices=None, dt=None):
+        ff, noise_q = self.get_transition_matrices(dt)
+        self.ss, self.ss_inv = None, None
+        if indices is None:
+            self.buffer_xx[:self.num] = self.xx @ ff.T
+            self.buffer_pp[:self.num] = ff @ self.pp @ ff.T + noise_q
+        else:
+            self.buffer_xx[indices] = self.buffer_xx[indices] @ ff.T
+            self.buffer_pp[indices] = ff @ self.buffer_pp[indices] @ ff.T + noise_q
+
+    def transform(self, rotation, translation):
+        # rotation: [3, 3] and translation: [3] from the old frame to the new one, applied to all rows at once
+        aa, offset = get_frame_transform(rotation, translation)
+        self.ss, self.ss_inv = None, None
+        self.buffer_xx[:self.num] = self.xx @ aa.T + offset
+        self.buffer_pp[:self.num] = aa @ self.pp @ aa.T
+
+    def update(self, indices, zs):
+        indices = np.asarray(indices, dtype=int).reshape(-1)
+        if indices.size == 0:
+            return
+        zs = np.asarray(zs, dtype=float).reshape(-1, 3)  # [K, 3]
+        xx = self.buffer_xx[indices]  # [K, 6]
+        pp = self.buffer_pp[indices]  # [K, 6, 6]
+        zz = zs - xx @ self.hh.T
+        if self.ss_inv is not None:
+            ss_inv = self.ss_inv[indices]
+        else:
+            ss_inv = np.linalg.inv(self.hh @ pp @ self.hh.T + self.noise_r)
+        kk = pp @ self.hh.T @ ss_inv  # [K, 6, 3]
+        self.buffer_xx[indices] = xx + (kk @ zz[:, :, None])[:, :, 0]
+        self.buffer_pp[indices] = pp - kk @ self.hh @ pp
+        self.ss, self.ss_inv = None, None
+
+    def update_weighted(self, tracks, zs, weights):
+        # probabilistic data association, every track is updated by the weighted innovations of its gated
+        # detections, tracks, zs and weights: [P], [P, 3] and [P] of the gated pairs
+        tracks = np.asarray(tracks, dtype=int).reshape(-1)
+        if tracks.size == 0:
+            return
+        indices, rows = np.unique(tracks, return_inverse=True)
+        rows = rows.reshape(-1)
+        zs = np.asarray(zs, dtype=float).reshape(-1, 3)
+        weights = np.asarray(weights, dtype=float).reshape(-1)
+        xx = self.buffer_xx[indices]  # [K, 6]
+        pp = self.buffer_pp[indices]  # [K, 6, 6]
+        if self.ss_inv is not None:
+            ss, ss_inv = self.ss[indices], self.ss_inv[indices]
+        else:
+            ss = self.hh @ pp @ self.hh.T + self.noise_r
+            ss_inv = np.linalg.inv(ss)
+
+        zz = zs - xx[rows] @ self.hh.T  # [P, 3]
+        zc = np.zeros((indices.size, 3))  # the combined innovations
+        np.add.at(zc, rows, weights[:, None] * zz)
+        spread = np.zeros((indices.size, 3, 3))
+        np.add.at(spread, rows, weights[:, None, None] * zz[:, :, None] * zz[:, None, :])
+        miss = 1 - np.bincount(rows, weights=weights, minlength=indices.size)
+
+        kk = pp @ self.hh.T @ ss_inv  # [K, 6, 3]
+        self.buffer_xx[indices] = xx + (kk @ zc[:, :, None])[:, :, 0]
+        spread -= zc[:, :, None] * zc[:, None, :]
+        self.buffer_pp[indices] = (pp - (1 - miss)[:, None, None] * (kk @ ss @ kk.transpose(0, 2, 1)) +
+                                   kk @ spread @ kk.transpose(0, 2, 1))
+        self.ss, self.ss_inv = None, None
+
+    def compute_innovation(self):
+        if self.ss_inv is None:
+            self.ss = self.hh @ self.pp @ self.hh.T + self.noise_r
+            self.ss_inv = np.linalg.inv(self.ss)
+        return self.ss, self.ss_inv
+
+    def get_locations(self):
+        return self.xx[:, 0::2]  # [N, 3]
+
+    def get_velocities(self):
+        return self.xx[:, 1::2]  # [N, 3]
+
+    def extract(self, idx):
+        bank = KalmanFilterBank6D(self.dt, *self.sigmas, capacity=1)
+        bank.add(*self.buffer_xx[idx], pp=self.buffer_pp[idx])
+        return bank
+
+
+# the models of the IMM bank share the state x, vx, ax, y, vy, ay, z, vz, az
+IMM_MODELS = ['cv', 'ca', 'ct+', 'ct-']
+IMM_STATE_INDICES = np.array([0, 1, 3, 4, 6, 7])  # the rows of x, vx, y, vy, z, vz
+
+
+@functools.lru_cache(maxsize=64)
+def get_imm_matrices(dt, sigmas_a, turn_rate):
+    # [R, 9, 9] transitions and process noises of constant velocity, constant acceleration
+    # and coordinated turns at +turn_rate and -turn_rate in the xy plane
+    ff = np.zeros((len(IMM_MODELS), 9, 9))
+    noise_q = np.zeros((len(IMM_MODELS), 9, 9))
+    cv = np.array([[1, dt, 0], [0, 1, 0], [0, 0, 0]])
+    ca = np.array([[1, dt, 0.5 * dt ** 2], [0, 1, dt], [0, 0, 1]])
+    gg_cv = np.array([[0.5 * dt ** 2], [dt], [0]])
+    gg_ca = np.array([[dt ** 3 / 6], [0.5 * dt ** 2], [dt]])
+    for k in range(3):
+        block = slice(3 * k, 3 * k + 3)
+        for r, model in enumerate(IMM_MODELS):
+            ff[r, block, block] = ca if model == 'ca' else cv
+            noise_q[r, block, block] = (gg_ca @ gg_ca.T if model == 'ca' else gg_cv @ gg_cv.T) * sigmas_a[k] ** 2
+
+    for r, w in [(2, turn_rate), (3, -turn_rate)]:
+        sin, cos = np.sin(w * dt), np.cos(w * dt)
+        ff[r, 0, [1, 4]] = sin / w, -(1 - cos) / w
+        ff[r, 1, [1, 4]] = cos, -sin
+        ff[r, 3, [1, 4]] = (1 - cos) / w, sin / w
+        ff[r, 4, [1, 4]] = sin, cos
+    ff.setflags(write=False)
+    noise_q.setflags(write=False)
+    return ff, noise_q
+
+
+class IMMFilterBank6D:
+    def __init__(self, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1, capacity=16,
+                 turn_rate=0.5, stay_prob=0.95, init_probs=(0.7, 0.1, 0.1, 0.1)):
+        self.dt = dt
+        self.sigmas = (sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+        self.turn_rate = turn_rate
+        self.stay_prob = stay_prob
+        self.init_probs = np.asarray(init_probs, dtype=float)
+
+        # the combined estimate is exposed as a 6d constant velocity filter
+        template = KalmanFilter6D(dt, 0, 0, 0, 0, 0, 0, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+        self.noise_q = template.noise_q
+        self.noise_r = template.noise_r
+        self.pp0 = template.pp
+        self.ff = template.ff
+        self.hh = template.hh
+
+        # the model switching probabilities, trans[i, j] from model i to model j
+        r = len(IMM_MODELS)
+        self.trans = np.full((r, r), (1 - stay_prob) / (r - 1))
+        np.fill_diagonal(self.trans, stay_prob)
+        self.hh_models = np.zeros((3, 9))
+        self.hh_models[[0, 1, 2], [0, 3, 6]] = 1
+
+        self.num = 0
+        self.buffer_xx = np.zeros((capacity, 6))  # [capacity, 6], the combined estimates
+        self.buffer_pp = np.zeros((capacity, 6, 6))  # [capacity, 6, 6]
+        self.buffer_xs = np.zeros((capacity, r, 9))  # [capacity, R, 9], the estimates of every model
+        self.buffer_ps = np.zeros((capacity, r, 9, 9))  # [capacity, R, 9, 9]
+        self.buffer_mu = np.zeros((capacity, r))  # [capacity, R], the model probabilities
+        self.filters = []
+
+        self.ss = None  # [N, 3, 3]
+        self.ss_inv = None  # [N, 3, 3]
+
+    @property
+    def xx(self):
+        return self.buffer_xx[:self.num]  # [N, 6]
+
+    @property
+    def pp(self):
+        return self.buffer_pp[:self.num]  # [N, 6, 6]
+
+    @property
+    def mu(self):
+        return self.buffer_mu[:self.num]  # [N, R]
+
+    def __len__(self):
+        return self.num
+
+    def get_buffers(self):
+        return ['buffer_xx', 'buffer_pp', 'buffer_xs', 'buffer_ps', 'buffer_mu']
+
+    def reserve(self, capacity):
+        if capacity > self.buffer_xx.shape[0]:
+            capacity = max(capacity, 2 * self.buffer_xx.shape[0])
+            for name in self.get_buffers():
+                buffer = getattr(self, name)
+                resized = np.zeros((capacity,) + buffer.shape[1:])
+                resized[:self.num] = buffer[:self.num]
+                setattr(self, name, resized)
+
+    def add(self, x, vx, y, vy, z, vz, pp=None, xs=None, ps=None, mu=None):
+        # xs, ps and mu continue the models of an exported track, otherwise the models start from pp
+        self.reserve(self.num + 1)
+        pp = self.pp0 if pp is None else pp
+        if xs is None:
+            xs = np.zeros((len(IMM_MODELS), 9))
+            xs[:, IMM_STATE_INDICES] = x, vx, y, vy, z, vz
+            ps = np.diag(np.repeat(np.asarray(self.sigmas[:3], dtype=float) ** 2, 3))  # acceleration variances
+            ps[np.ix_(IMM_STATE_INDICES, IMM_STATE_INDICES)] = pp
+            mu = self.init_probs
+        self.buffer_xs[self.num] = xs
+        self.buffer_ps[self.num] = ps
+        self.buffer_mu[self.num] = mu
+        self.buffer_xx[self.num] = x, vx, y, vy, z, vz
+        self.buffer_pp[self.num] = pp
+        self.ss, self.ss_inv = None, None
+        view = KalmanFilterView6D(self, self.num)
+        self.filters.append(view)
+        self.num += 1
+        return view
+
+    def remove(self, keep):
+        keep = np.asarray(keep, dtype=bool).reshape(self.num)
+        num = int(keep.sum())
+        filters = []
+        for view, k in zip(self.filters, keep):
+            if k:
+                view.idx = len(filters)
+                filters.append(view)
+            else:
+                view.detach()
+        for name in self.get_buffers():
+            buffer = getattr(self, name)
+            buffer[:num] = buffer[:self.num][keep]
+        self.filters = filters
+        self.num = num
+        self.ss, self.ss_inv = None, None
+
+    def reorder(self, order):
+        order = np.asarray(order, dtype=int).reshape(self.num)
+        for name in self.get_buffers():
+            buffer = getattr(self, name)
+            buffer[:self.num] = buffer[:self.num][order]
+        self.filters = [self.filters[k] for k in order]
+        for idx, view in enumerate(self.filters):
+            view.idx = idx
+        self.ss, self.ss_inv = None, None
+
+    def extract(self, idx):
+        bank = IMMFilterBank6D(self.dt, *self.sigmas, capacity=1, turn_rate=self.turn_rate,
+                               stay_prob=self.stay_prob, init_probs=self.init_probs)
+        bank.add(*self.buffer_xx[idx], pp=self.buffer_pp[idx])
+        for name in self.get_buffers():
+            getattr(bank, name)[0] = getattr(self, name)[idx]
+        return bank
+
+    def combine(self, indices):
+        # moment matching of the models into the 6d estimates
+        xs, ps, mu = self.buffer_xs[indices], self.buffer_ps[indices], self.buffer_mu[indices]
+        xx = np.einsum('nr,nra->na', mu, xs)
+        dd = xs - xx[:, None, :]
+        pp = np.einsum('nr,nrab->nab', mu, ps + dd[:, :, :, None] * dd[:, :, None, :])
+        self.buffer_xx[indices] = xx[:, IMM_STATE_INDICES]
+        self.buffer_pp[indices] = pp[:, IMM_STATE_INDICES][:, :, IMM_STATE_INDICES]
+
+    def predict(self, indices=None, dt=None):
+        dt = self.dt if dt is None else get_dt_key(dt)
+        ff, noise_q = get_imm_matrices(dt, self.sigmas[:3], self.turn_rate)
+        indices = np.arange(self.num) if indices is None else np.asarray(indices, dtype=int).reshape(-1)
+        self.ss, self.ss_inv = None, None
+        xs, ps, mu = self.buffer_xs[indices], self.buffer_ps[indices], self.buffer_mu[indices]
+
+        # mix the estimates of all models for every model, then predict all of them at once
+        cc = mu @ self.trans  # [N, R]
+        mix = mu[:, :, None] * self.trans / cc[:, None, :]  # [N, R, R], from model i to model j
+        xs0 = np.einsum('nij,nia->nja', mix, xs)
+        dd = xs[:, :, None, :] - xs0[:, None, :, :]  # [N, R, R, 9]
+        ps0 = np.einsum('nij,niab->njab', mix, ps) + np.einsum('nij,nija,nijb->njab', mix, dd, dd)
+        self.buffer_xs[indices] = np.einsum('rab,nrb->nra', ff, xs0)
+        self.buffer_ps[indices] = ff @ ps0 @ ff.transpose(0, 2, 1) + noise_q
+        self.buffer_mu[indices] = cc
+        self.combine(indices)
+
+    def transform(self, rotation, translation):
+        # the models carry accelerations as well, which rotate as the velocities
+        aa, offset = get_frame_transform(rotation, translation, 3)
+        self.ss, self.ss_inv = None, None
+        self.buffer_xs[:self.num] = self.buffer_xs[:self.num] @ aa.T + offset
+        self.buffer_ps[:self.num] = aa @ self.buffer_ps[:self.num] @ aa.T
+        self.combine(np.arange(self.num))
+
+    def update(self, indices, zs):
+        indices = np.asarray(indices, dtype=int).reshape(-1)
+        if indices.size == 0:
+            return
+        zs = np.asarray(zs, dtype=float).reshape(-1, 3)  # [K, 3]
+        xs, ps, mu = self.buffer_xs[indices], self.buffer_ps[indices], self.buffer_mu[indices]
+        hh = self.hh_models
+
+        # update every model, and weight the models by the likelihoods of their innovations
+        zz = zs[:, None, :] - xs @ hh.T  # [K, R, 3]
+        ss = hh @ ps @ hh.T + self.noise_r  # [K, R, 3, 3]
+        ss_inv = np.linalg.inv(ss)
+        kk = ps @ hh.T @ ss_inv  # [K, R, 9, 3]
+        self.buffer_xs[indices] = xs + (kk @ zz[..., None])[..., 0]
+        self.buffer_ps[indices] = ps - kk @ hh @ ps
+        _, logdet = np.linalg.slogdet(ss)
+        loglik = -0.5 * (np.einsum('kra,krab,krb->kr', zz, ss_inv, zz) + logdet)
+        weights = mu * np.exp(loglik - loglik.max(axis=1, keepdims=True))
+        self.buffer_mu[indices] = weights / weights.sum(axis=1, keepdims=True)
+        self.combine(indices)
+        self.ss, self.ss_inv = None, None
+
+    def compute_innovation(self):
+        if self.ss_inv is None:
+            self.ss = self.hh @ self.pp @ self.hh.T + self.noise_r
+            self.ss_inv = np.linalg.inv(self.ss)
+        return self.ss, self.ss_inv
+
+    def get_locations(self):
+        return self.xx[:, 0::2]  # [N, 3]
+
+    def get_velocities(self):
+        return self.xx[:, 1::2]  # [N, 3]
+
+
+class KalmanFilterView6D:
+    __slots__ = ['bank', 'idx']
+
+    def __init__(self, bank, idx):
+        self.bank = bank
+        self.idx = idx
+
+    def detach(self):
+        bank = self.bank.extract(self.idx)
+        self.bank, self.idx = bank, 0
+        bank.filters = [self]
+
+    @property
+    def dt(self):
+        return self.bank.dt
+
+    @property
+    def ff(self):
+        return self.bank.ff
+
+    @property
+    def hh(self):
+        return self.bank.hh
+
+    @property
+    def noise_q(self):
+        return self.bank.noise_q
+
+    @property
+    def noise_r(self):
+        return self.bank.noise_r
+
+    @property
+    def xx(self):
+        return self.bank.buffer_xx[self.idx].reshape(6, 1)
+
+    @xx.setter
+    def xx(self, value):
+        self.bank.buffer_xx[self.idx] = np.reshape(value, 6)
+
+    @property
+    def pp(self):
+        return self.bank.buffer_pp[self.idx]
+
+    @pp.setter
+    def pp(self, value):
+        self.bank.buffer_pp[self.idx] = value
+
+    def predict(self, dt=None):
+        self.bank.predict([self.idx], dt)
+
+    def update(self, zx, zy, zz):
+        self.bank.update([self.idx], [zx, zy, zz])
+
+    def get_location(self):
+        xx = self.bank.buffer_xx[self.idx]
+        return xx[0], xx[2], xx[4]
+
+    def get_velocity(self):
+        xx = self.bank.buffer_xx[self.idx]
+        return xx[1], xx[3], xx[5]
+
+    def get_state(self):
+        return tuple(self.bank.buffer_xx[self.idx])
+
+    def set_state(self, x, vx, y, vy, z, vz):
+        self.bank.buffer_xx[self.idx] = x, vx, y, vy, z, vz
+
+
+class ConstantVelocityKalmanFilter:
+    def __init__(self, dt, locations, velocities, sigmas_a, sigmas_o):
+        n = len(locations)
+        self.dt = dt
+        self.num_axes = n
+        self.sigmas_a = tuple(sigmas_a)
+
+        # dense matrices are kept for reference, the kernels below only use their 2x2 blocks per axis
+        self.noise_q = np.zeros((2 * n, 2 * n))
+        self.noise_r = np.diag(np.asarray(sigmas_o, dtype=float) ** 2)
+        self.ff = np.eye(2 * n)
+        self.hh = np.zeros((n, 2 * n))
+        for k in range(n):
+            gg = np.array([[0.5 * dt ** 2], [dt]])
+            self.noise_q[2 * k:2 * k + 2, 2 * k:2 * k + 2] = gg @ gg.T * sigmas_a[k] ** 2
+            self.ff[2 * k, 2 * k + 1] = dt
+            self.hh[k, 2 * k] = 1
+
+        self.buffer_xx = np.zeros((2 * n, 1))
+        self.buffer_pp = np.zeros((2 * n, 2 * n))
+        self.xx[0::2, 0] = locations
+        self.xx[1::2, 0] = velocities
+        self.pp[0::2, 0::2] = self.noise_r
+        self.bind_views()
+
+        step = 2 * (2 * n + 1)
+        self.q00 = self.noise_q.reshape(-1)[0:n * step:step].copy()
+        self.q01 = self.noise_q.reshape(-1)[1:n * step:step].copy()
+        self.q11 = self.noise_q.reshape(-1)[2 * n + 1:2 * n + 1 + n * step:step].copy()
+        self.rr = np.diag(self.noise_r).copy()
+
+        self.buffer_z = np.zeros(n)
+        self.buffer_s = np.zeros(n)
+        self.buffer_a = np.zeros(n)
+        self.buffer_b = np.zeros(n)
+
+    @property
+    def xx(self):
+        return self.buffer_xx
+
+    @xx.setter
+    def xx(self, value):
+        # assignments are copied into the buffers, which the views of the kernels point into
+        self.buffer_xx[:] = np.reshape(value, self.buffer_xx.shape)
+
+    @property
+    def pp(self):
+        return self.buffer_pp
+
+    @pp.setter
+    def pp(self, value):
+        self.buffer_pp[:] = value
+
+    def bind_views(self):
+        # strided views into xx and pp, one entry per axis
+        n = self.num_axes
+        self.xs = self.xx[0::2, 0]
+        self.vs = self.xx[1::2, 0]
+        flat, step = self.pp.reshape(-1), 2 * (2 * n + 1)
+        self.p00 = flat[0:n * step:step]
+        self.p01 = flat[1:n * step:step]
+        self.p10 = flat[2 * n:2 * n + n * step:step]
+        self.p11 = flat[2 * n + 1:2 * n + 1 + n * step:step]
+
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items()
+                if key not in ['xs', 'vs', 'p00', 'p01', 'p10', 'p11']}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.bind_views()
+
+    def predict(self, dt=None):
+        if dt is None or dt == self.dt:
+            dt, q00, q01, q11 = self.dt, self.q00, self.q01, self.q11
+        else:
+            dt = get_dt_key(dt)
+            q00, q01, q11 = get_noise_blocks(dt, self.sigmas_a)
+        a = self.buffer_a
+        np.multiply(self.vs, dt, out=a)
+        self.xs += a
+        np.add(self.p01, self.p10, out=a)
+        a *= dt
+        self.p00 += a
+        np.multiply(self.p11, dt * dt, out=a)
+        self.p00 += a
+        self.p00 += q00
+        np.multiply(self.p11, dt, out=a)
+        self.p01 += a
+        self.p01 += q01
+        self.p10 += a
+        self.p10 += q01
+        self.p11 += q11
+
+    def update_locations(self):
+        z, s, a, b = self.buffer_z, self.buffer_s, self.buffer_a, self.buffer_b
+        z -= self.xs  # innovation
+        np.add(self.p00, self.rr, out=s)  # innovation covariance
+
+        # velocity rows go first because they depend on the location rows before the update
+        np.divide(self.p10, s, out=a)
+        np.multiply(a, z, out=b)
+        self.vs += b
+        np.multiply(a, self.p01, out=b)
+        self.p11 -= b
+        np.multiply(a, self.p00, out=b)
+        self.p10 -= b
+
+        np.divide(self.p00, s, out=a)
+        np.multiply(a, z, out=b)
+        self.xs += b
+        np.multiply(a, self.p01, out=b)
+        self.p01 -= b
+        np.multiply(a, self.p00, out=b)
+        self.p00 -= b
+
+
+class FastKalmanFilter2D(ConstantVelocityKalmanFilter):
+    def __init__(self, dt, x, vx, sigma_ax=1, sigma_ox=1):
+        super().__init__(dt, [x], [vx], [sigma_ax], [sigma_ox])
+
+    def update(self, zx):
+        self.buffer_z[0] = zx
+        self.update_locations()
+
+    def get_location(self):
+        return self.xx[0, 0]
+
+    def get_velocity(self):
+        return self.xx[1, 0]
+
+    def get_state(self):
+        return self.xx[0, 0], self.xx[1, 0]
+
+    def set_state(self, x, vx):
+        self.xx[0, 0] = x
+        self.xx[1, 0] = vx
+
+
+class FastKalmanFilter4D(ConstantVelocityKalmanFilter):
+    def __init__(self, dt, x, vx, y, vy, sigma_ax=1, sigma_ay=1, sigma_ox=1, sigma_oy=1):
+        super().__init__(dt, [x, y], [vx, vy], [sigma_ax, sigma_ay], [sigma_ox, sigma_oy])
+
+    def update(self, zx, zy):
+        self.buffer_z[0] = zx
+        self.buffer_z[1] = zy
+        self.update_locations()
+
+    def get_location(self):
+        return self.xx[0, 0], self.xx[2, 0]
+
+    def get_velocity(self):
+        return self.xx[1, 0], self.xx[3, 0]
+
+    def get_state(self):
+        return self.xx[0, 0], self.xx[1, 0], self.xx[2, 0], self.xx[3, 0]
+
+    def set_state(self, x, vx, y, vy):
+        self.xx[0, 0] = x
+        self.xx[1, 0] = vx
+        self.xx[2, 0] = y
+        self.xx[3, 0] = vy
+
+
+class FastKalmanFilter6D(ConstantVelocityKalmanFilter):
+    def __init__(self, dt, x, vx, y, vy, z, vz, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1):
+        super().__init__(dt, [x, y, z], [vx, vy, vz], [sigma_ax, sigma_ay, sigma_az], [sigma_ox, sigma_oy, sigma_oz])
+
+    def update(self, zx, zy, zz):
+        self.buffer_z[0] = zx
+        self.buffer_z[1] = zy
+        self.buffer_z[2] = zz
+        self.update_locations()
+
+    def get_location(self):
+        return self.xx[0, 0], self.xx[2, 0], self.xx[4, 0]
+
+    def get_velocity(self):
+        return self.xx[1, 0], self.xx[3, 0], self.xx[5, 0]
+
+    def get_state(self):
+        return self.xx[0, 0], self.xx[1, 0], self.xx[2, 0], self.xx[3, 0], self.xx[4, 0], self.xx[5, 0]
+
+    def set_state(self, x, vx, y, vy, z, vz):
+        self.xx[0, 0] = x
+        self.xx[1, 0] = vx
+        self.xx[2, 0] = y
+        self.xx[3, 0] = vy
+        self.xx[4, 0] = z
+        self.xx[5, 0] = vz
@@ -0,0 +1,72 @@
+import collections
+import time
+
+import numpy as np
+
+
+class FrameMetrics():
+    __slots__ = ['stage_times', 'total_time', 'detection_num', 'track_num', 'candidate_num',
+                 'pair_num', 'gate_hit_num', 'gate_miss_num', 'birth_num', 'death_num', 'shed_num']
+
+    def __init__(self):
+        self.stage_times = {}  # second
+        self.total_time = 0.0  # second
+        self.detection_num = 0
+        self.track_num = 0
+        self.candidate_num = 0
+        self.pair_num = 0  # track and detection pairs whose distance was evaluated
+        self.gate_hit_num = 0  # tracks associated with a detection
+        self.gate_miss_num = 0  # tracks without any detection inside the gate
+        self.birth_num = 0
+        self.death_num = 0
+        self.shed_num = 0  # tentative tracks shed to stay within the budgets
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class TrackerMetrics():
+    def __init__(self, callback=None, history=1000):
+        self.callback = callback
+        self.frames = collections.deque(maxlen=history)
+        self.current = None
+        self.t_start = 0.0
+        self.t_lap = 0.0
+
+    def begin_frame(self):
+        self.current = FrameMetrics()
+        self.t_start = self.t_lap = time.perf_counter()
+
+    def lap(self, stage):
+        # charge the time since the previous lap to the stage
+        t = time.perf_counter()
+        self.current.stage_times[stage] = self.current.stage_times.get(stage, 0.0) + t - self.t_lap
+        self.t_lap = t
+
+    def end_frame(self, **counts):
+        frame = self.current
+        frame.total_time = time.perf_counter() - self.t_start
+        for key, value in counts.items():
+            setattr(frame, key, value)
+        self.frames.append(frame)
+        self.current = None
+        if self.callback is not None:
+            self.callback(frame)
+        return frame
+
+    def get_last_frame(self):
+        return self.frames[-1] if len(self.frames) > 0 else None
+
+    def get_summary(self, percentiles=(50, 90, 99)):
+        summary = dict(frame_num=len(self.frames))
+        if len(self.frames) == 0:
+            return summary
+        stages = ['total'] + list(dict.fromkeys(s for frame in self.frames for s in frame.stage_times))
+        for stage in stages:
+            values = np.array([frame.total_time if stage == 'total' else frame.stage_times.get(stage, 0.0)
+                               for frame in self.frames]) * 1000
+            summary['%s_ms' % stage] = dict(mean=float(values.mean()),
+                                            **{'p%d' % p: float(np.percentile(values, p)) for p in percentiles})
+        for key in ['pair_num', 'gate_hit_num', 'gate_miss_num', 'birth_num', 'death_num', 'shed_num']:
+            summary[key] = int(sum(getattr(frame, key) for frame in self.frames))
+        return summary
@@ -18,3 +18,117 @@ def get_voxel(x0, y0, z0, length, width, height):
     zs = np.array([-dz, -dz, -dz, -dz, dz, dz, dz, dz]).reshape(2, 2, 2) + z0
     filled = np.ones((1, 1, 1))
     return xs, ys, zs, filled
+
+
+# the corners of a unit box and the corners of its six faces
+BOX_CORNERS = np.array([[-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+                        [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]]) * 0.5
+BOX_FACES = np.array([[0, 1, 2, 3], [4, 5, 6, 7], [0, 1, 5, 4], [2, 3, 7, 6], [1, 2, 6, 5], [0, 3, 7, 4]])
+
+
+def get_box_faces(boxes):
+    # boxes: [N, 6] array of x, y, z, l, w, h, returns [6 * N, 4, 3] polygons
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 6)
+    corners = boxes[:, None, :3] + boxes[:, None, 3:] * BOX_CORNERS  # [N, 8, 3]
+    return corners[:, BOX_FACES].reshape(-1, 4, 3)
+
+
+def get_circles(centers, r, num=100):
+    # centers: [N, 3], returns [N, num, 3] polylines
+    theta = np.linspace(0, 2 * np.pi, num)
+    unit = np.stack([np.cos(theta), np.sin(theta), np.zeros(num)], axis=1)
+    return np.asarray(centers, dtype=float).reshape(-1, 1, 3) + r * unit
+
+
+class SceneRenderer():
+    def __init__(self, fig, ax, plot_range, ego_location, detect_range, gate, blit=True, writer=None):
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection, Poly3DCollection
+
+        self.fig = fig
+        self.ax = ax
+        self.gate = gate
+        self.blit = blit
+        self.writer = writer  # a matplotlib.animation writer to grab every frame into, which draws headlessly
+
+        # the ego vehicle and the range of detection are drawn once into the background
+        ax.scatter([ego_location[0]], [ego_location[1]], [ego_location[2]], c='blue', s=20)
+        xs, ys, zs = get_circle(ego_location[0], ego_location[1], ego_location[2], detect_range)
+        ax.plot(xs, ys, zs, '--', c='gray', linewidth=1)
+
+        # observations, tracks and gates are one collection each, updated in place every frame
+        self.observed = Poly3DCollection(np.zeros((0, 4, 3)), facecolors='gray', edgecolors='gray',
+                                         linewidths=0.1, alpha=0.5, animated=blit)
+        self.tracked = Poly3DCollection(np.zeros((0, 4, 3)), facecolors='red', edgecolors='red',
+                                        linewidths=0.1, alpha=0.5, animated=blit)
+        self.gates = Line3DCollection(np.zeros((0, 2, 3)), colors='red', linestyles='--', linewidths=1,
+                                      animated=blit)
+        for collection in [self.observed, self.tracked, self.gates]:
+            ax.add_collection3d(collection, autolim=False)
+        self.texts = []
+
+        xmin, ymin, zmin, xmax, ymax, zmax = plot_range
+        ax.set_xlim(xmin, xmax)
+        ax.set_ylim(ymin, ymax)
+        ax.set_zlim(zmin, zmax)
+        ax.tick_params(labelsize=8)
+        ax.set_xlabel('X (m)', fontsize=8)
+        ax.set_ylabel('Y (m)', fontsize=8)
+        ax.set_zlabel('Z (m)', fontsize=8)
+        ax.view_init(elev=45, azim=-135)
+
+        # the background is captured again whenever the whole figure is drawn, e.g. after rotating the view
+        self.background = None
+        if blit:
+            fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def get_texts(self, num):
+        while len(self.texts) < num:
+            self.texts.append(self.ax.text(0, 0, 0, '', color='black', fontsize=6, animated=self.blit))
+        return self.texts
+
+    def get_artists(self):
+        return [self.observed, self.tracked, self.gates] + self.texts
+
+    def update(self, observed, tracks):
+        # observed: [M, 6] boxes, tracks: confirmed tracks of tracker_utils.TRACK_DTYPE
+        boxes = np.concatenate([tracks['state'][:, 0::2], tracks['shape']], axis=1)  # [N, 6]
+        self.observed.set_verts(get_box_faces(observed))
+        self.tracked.set_verts(get_box_faces(boxes))
+        self.gates.set_segments(get_circles(boxes[:, :3], self.gate))
+
+        texts = self.get_texts(len(boxes))
+        corners = boxes[:, :3] + boxes[:, 3:] / 2
+        for j, text in enumerate(texts):
+            if j < len(boxes):
+                text.set_position_3d(corners[j])
+                text.set_text(str(tracks['number'][j]))
+            text.set_visible(j < len(boxes))
+        self.draw()
+
+    def draw_artists(self):
+        # the collections are projected by a full draw only, which blitting skips
+        for collection in [self.observed, self.tracked, self.gates]:
+            collection.do_3d_projection()
+        for artist in self.get_artists():
+            self.ax.draw_artist(artist)
+
+    def draw(self):
+        canvas = self.fig.canvas
+        if self.writer is not None:
+            self.writer.grab_frame()
+            return
+        if not self.blit:
+            canvas.draw_idle()
+            canvas.flush_events()
+            return
+        if self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_artists()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
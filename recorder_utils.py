@@ -0,0 +1,214 @@
+import json
+import os
+
+import numpy as np
+
+import tracker_utils
+
+
+# one row per recorded frame, the other columns are sliced by the starts and nums
+FRAME_DTYPE = np.dtype([
+    ('timestamp', np.float64), ('tracked_num', np.int64), ('ego_pose', np.float64, (4, 4)),
+    ('track_start', np.int64), ('track_num', np.int64),
+    ('detection_start', np.int64), ('detection_num', np.int64),
+    ('candidate_start', np.int64), ('candidate_num', np.int64)])
+
+
+class MappedColumn():
+    def __init__(self, path, dtype, shape=(), mode='r', num=None, capacity=1024):
+        # a growing array in a raw binary file, mapped into memory
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.itemsize = self.dtype.itemsize * int(np.prod(self.shape, dtype=np.int64))
+        self.mode = mode
+        if mode == 'w':
+            open(path, 'wb').close()
+            self.num = 0
+            self.map(capacity)
+        else:
+            self.num = os.path.getsize(path) // self.itemsize if num is None else num
+            self.data = np.memmap(path, dtype=self.dtype, mode='r', shape=(self.num,) + self.shape) \
+                if self.num > 0 else np.zeros((0,) + self.shape, dtype=self.dtype)
+
+    def map(self, capacity):
+        with open(self.path, 'r+b') as f:
+            f.truncate(capacity * self.itemsize)
+        self.data = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(capacity,) + self.shape)
+
+    def __len__(self):
+        return self.num
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self.dtype).reshape((-1,) + self.shape)
+        num = self.num + values.shape[0]
+        if num > self.data.shape[0]:
+            self.data.flush()
+            self.map(max(num, 2 * self.data.shape[0]))
+        self.data[self.num:num] = values
+        self.num = num
+
+    def __getitem__(self, key):
+        return self.data[:self.num][key]
+
+    def flush(self):
+        if self.mode == 'w':
+            self.data.flush()
+
+    def close(self):
+        if self.mode == 'w':
+            self.data.flush()
+            self.data = None
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.num * self.itemsize)
+        self.data = None
+
+
+class TrackRecorder():
+    def __init__(self, directory, mode='r'):
+        # every column of the track records, the detections and the candidates is a file of the directory
+        self.directory = directory
+        self.mode = mode
+        if mode == 'w':
+            os.makedirs(directory, exist_ok=True)
+            nums = {}
+        else:
+            with open(os.path.join(directory, 'meta.json')) as f:
+                nums = json.load(f)
+
+        self.frames = MappedColumn(os.path.join(directory, 'frames.bin'), FRAME_DTYPE,
+                                   mode=mode, num=nums.get('frames'))
+        # the track columns follow the records of the motion model, which is known from the first recorded tracker
+        self.motion_model = nums.get('motion_model', 'cv')
+        self.columns = None
+        if mode != 'w':
+            self.columns = self.get_columns('track', self.get_record_dtype(), nums.get('tracks'))
+        self.detections = MappedColumn(os.path.join(directory, 'detections.bin'), np.float64, (6,),
+                                       mode=mode, num=nums.get('detections'))
+        self.candidates = self.get_columns('candidate', tracker_utils.CANDIDATE_DTYPE, nums.get('candidates'))
+
+    def get_columns(self, prefix, record_dtype, num):
+        columns = {}
+        for name in record_dtype.names:
+            dtype, _ = record_dtype.fields[name]
+            columns[name] = MappedColumn(os.path.join(self.directory, '%s_%s.bin' % (prefix, name)), dtype.base,
+                                         dtype.shape, mode=self.mode, num=num)
+        return columns
+
+    def get_record_dtype(self):
+        return tracker_utils.IMM_TRACK_RECORD_DTYPE if self.motion_model == 'imm' else tracker_utils.TRACK_RECORD_DTYPE
+
+    def get_all_columns(self):
+        columns = [] if self.columns is None else list(self.columns.values())
+        return [self.frames, self.detections] + columns + list(self.candidates.values())
+
+    def get_track_num(self):
+        return 0 if self.columns is None else len(self.columns['number'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def record(self, tracker, observed, timestamp=None):
+        # observed: [M, 6] detections of the frame, the state of the tracker after the frame is appended
+        if self.columns is None:
+            self.motion_model = tracker.motion_model
+            self.columns = self.get_columns('track', self.get_record_dtype(), None)
+        elif tracker.motion_model != self.motion_model:
+            raise ValueError('All recorded frames must be tracked with the same motion model')
+        records = tracker.export_objects(tracker.objs)
+        candidates = tracker.candidates
+        frame = np.zeros(1, dtype=FRAME_DTYPE)
+        frame[0] = (np.nan if timestamp is None else timestamp, tracker.tracked_num,
+                    np.nan if tracker.ego_pose is None else tracker.ego_pose,
+                    self.get_track_num(), len(records),
+                    len(self.detections), len(observed),
+                    len(self.candidates['hit_num']), len(candidates))
+        for name, column in self.columns.items():
+            column.append(records[name])
+        for name, column in self.candidates.items():
+            column.append(candidates[name])
+        self.detections.append(observed)
+        self.frames.append(frame)
+
+    def get_frame(self, i):
+        frame = self.frames[i]
+        s, n = frame['track_start'], frame['track_num']
+        records = np.zeros(n, dtype=self.get_record_dtype())
+        for name, column in self.columns.items():
+            records[name] = column[s:s + n]
+        s, n = frame['detection_start'], frame['detection_num']
+        detections = np.array(self.detections[s:s + n])
+        s, n = frame['candidate_start'], frame['candidate_num']
+        candidates = np.zeros(n, dtype=tracker_utils.CANDIDATE_DTYPE)
+        for name, column in self.candidates.items():
+            candidates[name] = column[s:s + n]
+        timestamp = None if np.isnan(frame['timestamp']) else float(frame['timestamp'])
+        ego_pose = None if np.isnan(frame['ego_pose']).any() else np.array(frame['ego_pose'])
+        return timestamp, detections, records, candidates, int(frame['tracked_num']), ego_pose
+
+    def write_meta(self):
+        nums = {'frames': len(self.frames), 'tracks': self.get_track_num(), 'motion_model': self.motion_model,
+                'detections': len(self.detections), 'candidates': len(self.candidates['hit_num'])}
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as f:
+            json.dump(nums, f)
+
+    def flush(self):
+        if self.mode == 'w':
+            for column in self.get_all_columns():
+                column.flush()
+            self.write_meta()
+
+    def close(self):
+        if self.mode == 'w':
+            self.write_meta()
+        for column in self.get_all_columns():
+            column.close()
+
+
+class ReplayEngine():
+    def __init__(self, directory, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1,
+                 gate=10, **kwargs):
+        # the tracker must be configured as the recorded one for the replay to reproduce it
+        self.recorder = TrackRecorder(directory, mode='r')
+        self.tracker_args = (dt, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz, gate)
+        self.tracker_kwargs = kwargs
+        self.tracker = None
+        self.frame = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.recorder)
+
+    def seek(self, frame):
+        # restore the tracker as it was after frame - 1, so that the next frame tracked is the given one
+        self.tracker = tracker_utils.MultipleTargetTracker(*self.tracker_args, **self.tracker_kwargs)
+        if frame > 0:
+            timestamp, _, records, candidates, tracked_num, ego_pose = self.recorder.get_frame(frame - 1)
+            self.tracker.load_state(records, candidates, tracked_num, timestamp, ego_pose)
+        self.frame = frame
+        return self.tracker
+
+    def replay(self, start=None, stop=None):
+        # yields the frame index and the confirmed tracks of every frame in [start, stop)
+        if start is not None or self.tracker is None:
+            self.seek(0 if start is None else start)
+        stop = len(self.recorder) if stop is None else min(stop, len(self.recorder))
+        while self.frame < stop:
+            timestamp, detections, _, _, _, ego_pose = self.recorder.get_frame(self.frame)
+            self.tracker.track_detections(detections, timestamp, ego_pose)
+            yield self.frame, self.tracker.get_confirmed_array()
+            self.frame += 1
+
+    def close(self):
+        self.recorder.close()
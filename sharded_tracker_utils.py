@@ -0,0 +1,223 @@
+import multiprocessing
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import association_utils
+import tracker_utils
+
+
+def get_bounds(edges, idx):
+    lower = edges[idx - 1] if idx > 0 else -np.inf
+    upper = edges[idx] if idx < len(edges) else np.inf
+    return lower, upper
+
+
+def attach_shared_memory(name):
+    # the coordinator owns the block and unlinks it, workers share its resource tracker
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def run_worker(connection, bounds, margin, tracker_args, tracker_kwargs):
+    xmin, xmax, ymin, ymax = bounds
+    tracker = tracker_utils.MultipleTargetTracker(*tracker_args, **tracker_kwargs)
+    candidate_sources = np.zeros(0, dtype=np.int64)  # the detection indices of the candidates in the previous frame
+    shm = None
+
+    while True:
+        message = connection.recv()
+        if message[0] == 'stop':
+            break
+
+        # the detections of the frame are read from the shared block, column 6 flags the used ones
+        _, name, num, records = message
+        if shm is None or shm.name != name:
+            if shm is not None:
+                shm.close()
+            shm = attach_shared_memory(name)
+        buffer = np.ndarray((shm.size // (7 * 8), 7), dtype=np.float64, buffer=shm.buf)
+        observed, used = buffer[:num, :6], buffer[:num, 6]
+        xs, ys = observed[:, 0], observed[:, 1]
+        region = np.flatnonzero((xs >= xmin - margin) & (xs < xmax + margin) &
+                                (ys >= ymin - margin) & (ys < ymax + margin))
+        tracker.import_objects(records)
+
+        # gate the tracks of the tile against the detections around it
+        if tracker.gating == 'mahalanobis':
+            tracker.predict_objects()
+        locations, gate, ss_inv = tracker.get_association_inputs()
+        grid = association_utils.UniformGrid(observed[region, :3], tracker.gate)
+        tracks, dets, dists = association_utils.get_gated_pairs(locations, grid, gate, ss_inv)
+        numbers = np.array([obj.number for obj in tracker.objs], dtype=np.int64)
+        connection.send((numbers, tracks, region[dets], dists))
+
+        # track with the resolved associations, then gate the candidates against the remaining detections
+        _, indices = connection.recv()
+        if tracker.gating != 'mahalanobis':
+            tracker.predict_objects()
+        tracker.correct_objects([observed[idx] if idx >= 0 else None for idx in indices])
+        tracker.delete_objects()
+        grid = association_utils.UniformGrid(observed[region, :3], tracker.gate)
+        grid.alive[:] = used[region] == 0
+        tracker.advance_candidates()
+        tracks, dets, dists = association_utils.get_gated_pairs(tracker.get_candidate_locations(), grid, tracker.gate)
+        connection.send((candidate_sources, tracks, region[dets], dists))
+
+        # give birth as resolved, and keep the remaining detections inside the tile as candidates
+        _, births = connection.recv()
+        indices = np.full(len(tracker.candidates), -1, dtype=np.int64)
+        numbers = np.full(len(tracker.candidates), -1, dtype=np.int64)
+        for j, idx, number in births:
+            indices[j], numbers[j] = idx, number
+        tracker.update_candidates(observed, indices, numbers)
+        core = np.flatnonzero((xs >= xmin) & (xs < xmax) & (ys >= ymin) & (ys < ymax) & (used == 0))
+        tracker.add_candidates(observed, core)
+        candidate_sources = core
+
+        # hand over the tracks which left the tile
+        tracks = tracker.get_confirmed_array()
+        locations = tracker.get_tracker_locations(tracker.objs)
+        keep = ((locations[:, 0] >= xmin) & (locations[:, 0] < xmax) &
+                (locations[:, 1] >= ymin) & (locations[:, 1] < ymax))
+        records = tracker.export_objects([obj for obj, k in zip(tracker.objs, keep) if not k])
+        tracker.remove_objects(keep)
+        connection.send((tracks, records))
+
+    if shm is not None:
+        shm.close()
+    connection.close()
+
+
+class ShardedTracker():
+    def __init__(self, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1,
+                 gate=10, x_edges=(0.0,), y_edges=(0.0,), margin=None, **kwargs):
+        self.x_edges = np.sort(np.asarray(x_edges, dtype=float))
+        self.y_edges = np.sort(np.asarray(y_edges, dtype=float))
+        self.margin = 2 * gate if margin is None else margin
+        self.gate = gate
+        self.association = kwargs.get('association', 'greedy')
+        if self.association == 'jpda':
+            raise ValueError('JPDA association is not supported by the sharded tracker')
+        if kwargs.get('birth_hits', 2) != 2 or kwargs.get('birth_frames', 2) != 2:
+            # the candidates of a worker must be the detections of its tile in the previous frame
+            raise ValueError('Only two point births are supported by the sharded tracker')
+        if kwargs.get('track_budget') is not None or kwargs.get('latency_budget') is not None:
+            raise ValueError('Load shedding is not supported by the sharded tracker')
+        self.track_gate = kwargs.get('chi2_gate', 11.34) ** 0.5 if kwargs.get('gating') == 'mahalanobis' else gate
+        self.tracked_num = 0
+
+        # the workers must share the resource tracker of the coordinator, which is started lazily otherwise
+        # and a tracker of their own would unlink the shared block when they exit
+        resource_tracker.ensure_running()
+
+        # one worker per tile, tiles are numbered along y first
+        tracker_args = (dt, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz, gate)
+        self.connections, self.workers = [], []
+        for i in range(len(self.x_edges) + 1):
+            for j in range(len(self.y_edges) + 1):
+                bounds = get_bounds(self.x_edges, i) + get_bounds(self.y_edges, j)
+                connection, worker_connection = multiprocessing.Pipe()
+                worker = multiprocessing.Process(
+                    target=run_worker, args=(worker_connection, bounds, self.margin, tracker_args, kwargs),
+                    daemon=True)
+                worker.start()
+                self.connections.append(connection)
+                self.workers.append(worker)
+        record_dtype = tracker_utils.IMM_TRACK_RECORD_DTYPE if kwargs.get('motion_model') == 'imm' else \
+            tracker_utils.TRACK_RECORD_DTYPE
+        self.imports = [np.zeros(0, dtype=record_dtype) for _ in self.workers]
+
+        self.shm = None
+        self.capacity = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_tiles(self, locations):
+        ix = np.searchsorted(self.x_edges, locations[:, 0], side='right')
+        iy = np.searchsorted(self.y_edges, locations[:, 1], side='right')
+        return ix * (len(self.y_edges) + 1) + iy
+
+    def write_detections(self, detections):
+        if self.shm is None or detections.shape[0] > self.capacity:
+            if self.shm is not None:
+                self.shm.close()
+                self.shm.unlink()
+            self.capacity = max(1024, 2 * detections.shape[0])
+            self.shm = shared_memory.SharedMemory(create=True, size=self.capacity * 7 * 8)
+        buffer = np.ndarray((self.capacity, 7), dtype=np.float64, buffer=self.shm.buf)
+        buffer[:detections.shape[0], :6] = detections
+        buffer[:detections.shape[0], 6] = 0
+        return buffer
+
+    def gather_pairs(self, replies, ranks):
+        # map the pairs of all workers to global rows ordered by ranks
+        offsets = np.cumsum([0] + [reply[0].size for reply in replies])
+        tracks = np.concatenate([ranks[offsets[w] + reply[1]] for w, reply in enumerate(replies)])
+        dets = np.concatenate([reply[2] for reply in replies])
+        dists = np.concatenate([reply[3] for reply in replies])
+        return offsets, tracks, dets, dists
+
+    def update_arrays(self, detections):
+        detections = np.asarray(detections, dtype=float).reshape(-1, 6)
+        num = detections.shape[0]
+        buffer = self.write_detections(detections)
+
+        # associate all tracks in the order of their numbers, as the tracking list of a single tracker is
+        for connection, records in zip(self.connections, self.imports):
+            connection.send(('associate', self.shm.name, num, records))
+        replies = [connection.recv() for connection in self.connections]
+        numbers = np.concatenate([reply[0] for reply in replies])
+        ranks = np.argsort(np.argsort(numbers, kind='stable'), kind='stable')
+        offsets, tracks, dets, dists = self.gather_pairs(replies, ranks)
+        indices = association_utils.assign_pairs(tracks, dets, dists, numbers.size, self.track_gate, self.association)
+        buffer[indices[indices >= 0], 6] = 1
+        for w, connection in enumerate(self.connections):
+            connection.send(('update', indices[ranks[offsets[w]:offsets[w + 1]]]))
+
+        # give birth in the order of the candidates, which is the order of their detections
+        replies = [connection.recv() for connection in self.connections]
+        sources = np.concatenate([reply[0] for reply in replies])
+        ranks = np.argsort(np.argsort(sources, kind='stable'), kind='stable')
+        offsets, tracks, dets, dists = self.gather_pairs(replies, ranks)
+        indices = association_utils.assign_pairs(tracks, dets, dists, sources.size, self.gate, self.association)
+        buffer[indices[indices >= 0], 6] = 1
+        births = [[] for _ in self.workers]
+        workers = np.searchsorted(offsets, np.arange(sources.size), side='right') - 1
+        for k in np.argsort(sources, kind='stable'):
+            if indices[ranks[k]] >= 0:
+                self.tracked_num += 1
+                births[workers[k]].append((k - offsets[workers[k]], indices[ranks[k]], self.tracked_num))
+        for connection, b in zip(self.connections, births):
+            connection.send(('birth', b))
+
+        # merge the outputs and route the handed over tracks to their new tiles
+        replies = [connection.recv() for connection in self.connections]
+        tracks = np.concatenate([reply[0] for reply in replies])
+        tracks = tracks[np.argsort(tracks['number'], kind='stable')]
+        records = np.concatenate([reply[1] for reply in replies])
+        tiles = self.get_tiles(records['xx'][:, 0::2])
+        self.imports = [records[tiles == w] for w in range(len(self.workers))]
+        return tracks
+
+    def track_stream(self, frames):
+        for detections in frames:
+            yield self.update_arrays(detections)
+
+    def close(self):
+        for connection, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                connection.send(('stop',))
+                worker.join()
+            connection.close()
+        self.connections, self.workers = [], []
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -59,4 +59,121 @@ def observe(target, r, sigma_ox, sigma_oy, sigma_oz):
         z += w
         return z, shape  # [3, 1], [3, 1]
     else:
-        return None, None
\ No newline at end of file
+        return None, None
+
+
+class SimulationEngine:
+    def __init__(self, target_num, dt, sigma_ax, sigma_ay, sigma_az, sigma_vl, sigma_vw, sigma_vh,
+                 sigma_ox, sigma_oy, sigma_oz, detect_range, rng=None, min_size=4.0, max_size=10.0, clutter_rate=0,
+                 ego_velocity=(0, 0, 0), ego_yaw_rate=0):
+        self.target_num = target_num
+        self.dt = dt
+        self.detect_range = detect_range
+        self.clutter_rate = clutter_rate  # the mean number of false detections per frame
+        self.min_size = min_size
+        self.max_size = max_size
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        # matrices are built once and applied to all targets together
+        self.f = np.array([[1, dt, 0, 0, 0, 0],
+                           [0, 1, 0, 0, 0, 0],
+                           [0, 0, 1, dt, 0, 0],
+                           [0, 0, 0, 1, 0, 0],
+                           [0, 0, 0, 0, 1, dt],
+                           [0, 0, 0, 0, 0, 1],
+                           ])
+        self.g = np.array([[0.5 * dt ** 2, 0, 0],
+                           [dt, 0, 0],
+                           [0, 0.5 * dt ** 2, 0],
+                           [0, dt, 0],
+                           [0, 0, 0.5 * dt ** 2],
+                           [0, 0, dt],
+                           ])
+        self.sigma_a = np.array([sigma_ax, sigma_ay, sigma_az])
+        self.sigma_v = np.array([sigma_vl, sigma_vw, sigma_vh])
+        self.sigma_o = np.array([sigma_ox, sigma_oy, sigma_oz])
+
+        self.states = np.zeros((target_num, 6))  # [target_num, 6]
+        self.states[:, 0] = 1500 * self.rng.random(target_num) + 100  # x location
+        self.states[:, 1] = 5 * self.rng.standard_normal(target_num) - 20  # x velocity
+        self.states[:, 2] = 40 * self.rng.standard_normal(target_num)  # y location
+        self.states[:, 3] = 1 * self.rng.standard_normal(target_num)  # y velocity
+        self.shapes = np.full((target_num, 3), 6.0)  # [target_num, 3]
+
+        # the ego vehicle moves at a constant velocity in its own frame and turns at a constant yaw rate,
+        # targets live in the world frame and are observed in the frame of the sensor on the ego
+        self.ego_velocity = np.asarray(ego_velocity, dtype=float)
+        self.ego_yaw_rate = ego_yaw_rate
+        self.ego_location = np.zeros(3)
+        self.ego_yaw = 0.0
+
+    def get_ego_rotation(self):
+        c, s = np.cos(self.ego_yaw), np.sin(self.ego_yaw)
+        return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+    def get_ego_pose(self):
+        # the [4, 4] transform from the sensor frame to the world frame
+        pose = np.eye(4)
+        pose[:3, :3] = self.get_ego_rotation()
+        pose[:3, 3] = self.ego_location
+        return pose
+
+    def get_sensor_locations(self):
+        return (self.states[:, 0::2] - self.ego_location) @ self.get_ego_rotation()  # [target_num, 3]
+
+    def get_targets(self):
+        # the same layout as one column of init_targets
+        return np.concatenate([self.states, self.shapes], axis=1).reshape(9 * self.target_num)
+
+    def step(self):
+        v = self.rng.standard_normal((self.target_num, 3)) * self.sigma_a
+        self.states = self.states @ self.f.T + v @ self.g.T
+        s = self.rng.standard_normal((self.target_num, 3)) * self.sigma_v
+        self.shapes = np.clip(self.shapes + s, self.min_size, self.max_size)
+        self.ego_location += self.get_ego_rotation() @ self.ego_velocity * self.dt
+        self.ego_yaw += self.ego_yaw_rate * self.dt
+
+    def observe(self):
+        # detections and clutter are in the sensor frame
+        locations = self.get_sensor_locations()
+        mask = locations[:, 0] ** 2 + locations[:, 1] ** 2 <= self.detect_range ** 2
+        num = int(mask.sum())
+        boxes = np.zeros((num, 6))  # [M, 6]
+        boxes[:, :3] = locations[mask] + self.rng.standard_normal((num, 3)) * self.sigma_o
+        boxes[:, 3:] = self.shapes[mask]
+        if self.clutter_rate > 0:
+            boxes = np.concatenate([boxes, self.generate_clutter()], axis=0)
+        return boxes
+
+    def generate_clutter(self):
+        # false detections spread uniformly over the range of detection
+        num = self.rng.poisson(self.clutter_rate)
+        r = self.detect_range * np.sqrt(self.rng.random(num))
+        theta = 2 * np.pi * self.rng.random(num)
+        boxes = np.zeros((num, 6))  # [num, 6]
+        boxes[:, 0] = r * np.cos(theta)
+        boxes[:, 1] = r * np.sin(theta)
+        boxes[:, 2] = self.rng.standard_normal(num) * self.sigma_o[2]
+        boxes[:, 3:] = self.rng.uniform(self.min_size, self.max_size, (num, 3))
+        return boxes
+
+    def generate_frames(self, iter_num):
+        for _ in range(iter_num):
+            self.step()
+            yield self.observe()
+
+    def generate_posed_frames(self, iter_num):
+        # yield the detections of every frame with the pose of the sensor they were observed from
+        for _ in range(iter_num):
+            self.step()
+            yield self.observe(), self.get_ego_pose()
+
+    def generate_chunks(self, iter_num, chunk_size=1000):
+        # yield the targets in chunks of [9 * target_num, chunk_size] instead of the whole history
+        for start in range(0, iter_num, chunk_size):
+            num = min(chunk_size, iter_num - start)
+            targets = np.zeros((9 * self.target_num, num))
+            for i in range(num):
+                self.step()
+                targets[:, i] = self.get_targets()
+            yield targets
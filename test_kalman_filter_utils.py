@@ -0,0 +1,41 @@
+import numpy as np
+
+import kalman_filter_utils
+
+
+def get_filter_pairs(dt):
+    return [
+        (kalman_filter_utils.KalmanFilter2D(dt, 1, 2, 0.5, 0.2),
+         kalman_filter_utils.FastKalmanFilter2D(dt, 1, 2, 0.5, 0.2)),
+        (kalman_filter_utils.KalmanFilter4D(dt, 1, 2, -3, 4, 0.5, 1.5, 0.2, 0.3),
+         kalman_filter_utils.FastKalmanFilter4D(dt, 1, 2, -3, 4, 0.5, 1.5, 0.2, 0.3)),
+        (kalman_filter_utils.KalmanFilter6D(dt, 1, 2, -3, 4, 5, -6, 0.5, 1.5, 0.1, 0.2, 0.3, 0.05),
+         kalman_filter_utils.FastKalmanFilter6D(dt, 1, 2, -3, 4, 5, -6, 0.5, 1.5, 0.1, 0.2, 0.3, 0.05)),
+    ]
+
+
+def test_fast_filters_match_dense_filters():
+    rng = np.random.default_rng(0)
+    for dense, fast in get_filter_pairs(0.1):
+        for i in range(50):
+            dense.predict()
+            fast.predict()
+            assert np.allclose(fast.xx, dense.xx) and np.allclose(fast.pp, dense.pp)
+
+            # some frames are missed, as the trackers predict without an update
+            if i % 7 != 3:
+                zs = np.asarray(fast.get_location()) + rng.normal(size=np.shape(fast.get_location()))
+                dense.update(*np.atleast_1d(zs))
+                fast.update(*np.atleast_1d(zs))
+                assert np.allclose(fast.xx, dense.xx) and np.allclose(fast.pp, dense.pp)
+
+
+def test_fast_filter_assignments_reach_kernels():
+    for dense, fast in get_filter_pairs(0.1):
+        n = fast.xx.shape[0]
+        for kf in [dense, fast]:
+            kf.xx = np.arange(n, dtype=float).reshape(n, 1)
+            kf.pp = np.eye(n)
+            kf.predict()
+            kf.update(*np.ones(n // 2))
+        assert np.allclose(fast.xx, dense.xx) and np.allclose(fast.pp, dense.pp)
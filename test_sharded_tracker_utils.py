@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+import sharded_tracker_utils
+import simulation_utils
+import tracker_utils
+
+
+@pytest.mark.parametrize('kwargs', [
+    {}, dict(association='global'), dict(filter_bank=True),
+    dict(filter_bank=True, gating='mahalanobis'), dict(filter_bank=True, motion_model='imm')])
+def test_sharded_tracker_matches_single_tracker(kwargs):
+    # targets drive along -x through the x edge, and the y edges split the lanes
+    engine = simulation_utils.SimulationEngine(
+        400, 0.1, 1, 1, 0.01, 1, 1, 1, 0.1, 0.1, 0.001, 150, rng=np.random.default_rng(0), clutter_rate=5)
+    frames = [np.zeros((0, 6))] + list(engine.generate_frames(80))
+
+    tracker = tracker_utils.MultipleTargetTracker(0.1, 1, 1, 0.01, 0.1, 0.1, 0.001, 10, **kwargs)
+    with sharded_tracker_utils.ShardedTracker(0.1, 1, 1, 0.01, 0.1, 0.1, 0.001, 10, x_edges=[80.0],
+                                              y_edges=[-20.0, 20.0], **kwargs) as sharded:
+        for detections in frames:
+            expected, tracks = tracker.update_arrays(detections), sharded.update_arrays(detections)
+            assert np.array_equal(tracks['number'], expected['number'])
+            assert np.allclose(tracks['state'], expected['state'], rtol=0, atol=1e-9)
+    assert len(tracks) > 0
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+
+import simulation_utils
+import tracker_pool_utils
+import tracker_utils
+
+
+def get_line_frame(i, num=5):
+    # num targets 20 m apart, all moving along x at 10 m/s
+    return np.array([[20.0 * k + 1.0 * i, 0, 0, 4, 4, 4] for k in range(num)])
+
+
+def test_dropped_frames_are_predicted_over():
+    with tracker_pool_utils.TrackerPool(0.1, gate=5, worker_num=0, max_pending=2) as pool:
+        for i in range(30):
+            pool.submit(0, get_line_frame(i))
+            if i % 3 == 2:
+                tracks = pool.step()[0]
+        assert pool.dropped[0] == 10
+
+    # the pool tracks as a tracker given the frames it kept and their timestamps
+    tracker = tracker_utils.MultipleTargetTracker(0.1, gate=5)
+    for i in range(30):
+        if i % 3 != 0:
+            expected = tracker.update_arrays(get_line_frame(i), 0.1 * i)
+    assert len(tracks) == 5
+    assert np.array_equal(tracks['number'], expected['number'])
+    assert np.allclose(tracks['state'], expected['state'])
+
+
+def test_workers_match_standalone_trackers():
+    engines = [simulation_utils.SimulationEngine(200, 0.1, 1, 1, 0.01, 1, 1, 1, 0.1, 0.1, 0.001, 150,
+                                                 rng=np.random.default_rng(s)) for s in range(6)]
+    trackers = [tracker_utils.MultipleTargetTracker(0.1, gate=10, filter_bank=True) for _ in engines]
+    with tracker_pool_utils.TrackerPool(0.1, gate=10, stream_ids=range(6), worker_num=3, filter_bank=True) as pool:
+        for i in range(40):
+            frames = {s: (engine.step(), engine.observe())[1] for s, engine in enumerate(engines)}
+            results = pool.step(frames)
+            assert sorted(results) == list(range(6))
+            for s, tracker in enumerate(trackers):
+                expected = tracker.update_arrays(frames[s], 0.1 * i)
+                assert np.array_equal(results[s]['number'], expected['number'])
+                assert np.array_equal(results[s]['state'], expected['state'])
+        assert sum(len(tracks) for tracks in results.values()) > 0
+
+
+def test_close_waits_for_busy_workers():
+    pool = tracker_pool_utils.TrackerPool(0.1, gate=10, stream_ids=range(2), worker_num=2)
+    rng = np.random.default_rng(0)
+    for _ in range(3):
+        pool.step({s: rng.uniform(0, 1000, (3000, 6)) for s in range(2)}, timeout=0)
+
+    # the results of the busy workers are collected by close, which must return
+    assert any(pool.busy)
+    closer = threading.Thread(target=pool.close)
+    closer.start()
+    closer.join(30)
+    assert not closer.is_alive()
+    assert pool.workers == []
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import simulation_utils
+import tracker_utils
+
+
+def get_line_frame(i, num=5):
+    # num targets 20 m apart, all moving along x at 10 m/s
+    return np.array([[20.0 * k + 1.0 * i, 0, 0, 4, 4, 4] for k in range(num)])
+
+
+def test_refused_births_stay_candidates():
+    events = []
+    tracker = tracker_utils.MultipleTargetTracker(0.1, gate=2, track_budget=2, shed_callback=events.append)
+    for i in range(3):
+        tracker.update_arrays(get_line_frame(i))
+
+    # the two tracks fill the budget, so the births of the candidates detected twice are refused
+    assert len(tracker.objs) == 2
+    assert events[-1]['refused_birth_num'] == 2
+    refused = tracker.candidates[tracker.candidates['hit_num'] == 2]
+    assert len(refused) == 2
+    locations = get_line_frame(2)[:, :3]
+    assert all(np.any(np.all(locations == location, axis=1)) for location in refused['location'])
+
+    # and they are born once there is room again
+    tracker.track_budget = 4
+    tracker.track_limit = 4
+    tracker.update_arrays(get_line_frame(3))
+    assert len(tracker.objs) == 4
+
+
+def test_imm_snapshot_restores_models():
+    trackers = [tracker_utils.MultipleTargetTracker(0.1, gate=2, filter_bank=True, motion_model='imm')
+                for _ in range(2)]
+    for i in range(10):
+        trackers[0].update_arrays(get_line_frame(i))
+    trackers[1].restore(trackers[0].snapshot())
+
+    # the models continue from their own states, covariances and probabilities
+    assert np.array_equal(trackers[1].bank.buffer_mu[:5], trackers[0].bank.buffer_mu[:5])
+    for i in range(10, 15):
+        tracks = [tracker.update_arrays(get_line_frame(i)) for tracker in trackers]
+        assert np.array_equal(tracks[0]['state'], tracks[1]['state'])
+
+
+@pytest.mark.parametrize('kwargs', [{}, dict(filter_bank=True)])
+def test_ego_pose_keeps_tracks_of_turning_ego(kwargs):
+    engine = simulation_utils.SimulationEngine(
+        300, 0.1, 1, 1, 0.01, 1, 1, 1, 0.1, 0.1, 0.001, 150, rng=np.random.default_rng(3),
+        ego_velocity=(15, 0, 0), ego_yaw_rate=0.5)
+    frames = list(engine.generate_posed_frames(100))
+    trackers = [tracker_utils.MultipleTargetTracker(0.1, 1, 1, 0.01, 0.1, 0.1, 0.001, 5, **kwargs) for _ in range(2)]
+    for detections, ego_pose in frames:
+        tracks = trackers[0].update_arrays(detections)
+        posed_tracks = trackers[1].update_arrays(detections, ego_pose=ego_pose)
+
+    # the tracks stay in the gate as the sensor frame turns, instead of being born again
+    assert trackers[1].tracked_num < trackers[0].tracked_num / 2
+    assert len(posed_tracks) > 2 * len(tracks)
+
+    # and they follow the targets in the world frame
+    ego_pose = frames[-1][1]
+    locations = posed_tracks['state'][:, 0::2] @ ego_pose[:3, :3].T + ego_pose[:3, 3]
+    distances = np.linalg.norm(locations[:, None, :] - engine.states[None, :, 0::2], axis=2).min(axis=1)
+    assert np.all(distances < 2)
@@ -0,0 +1,126 @@
+import collections
+import multiprocessing
+import time
+
+import numpy as np
+
+import tracker_utils
+
+
+def run_pool_worker(connection, stream_ids, tracker_args, tracker_kwargs):
+    trackers = {stream_id: tracker_utils.MultipleTargetTracker(*tracker_args, **tracker_kwargs)
+                for stream_id in stream_ids}
+    while True:
+        message = connection.recv()
+        if message[0] == 'stop':
+            break
+        _, frames = message
+        connection.send(process_frames(trackers, frames))
+    connection.close()
+
+
+def process_frames(trackers, frames):
+    # frames: stream id -> list of [M, 6] detections and their timestamps, the confirmed tracks of the last frame
+    # are returned, the timestamps predict the tracks over the frames dropped between them
+    results = {}
+    for stream_id, frame_list in frames.items():
+        for detections, timestamp in frame_list:
+            results[stream_id] = trackers[stream_id].update_arrays(detections, timestamp)
+    return results
+
+
+class TrackerPool():
+    def __init__(self, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1,
+                 gate=10, stream_ids=(0,), worker_num=None, max_pending=2, **kwargs):
+        self.stream_ids = list(stream_ids)
+        self.worker_num = multiprocessing.cpu_count() if worker_num is None else worker_num
+        self.worker_num = min(self.worker_num, len(self.stream_ids))
+
+        # frames wait here while the worker of their stream is busy, the oldest ones are dropped when full
+        self.pending = {stream_id: collections.deque(maxlen=max_pending) for stream_id in self.stream_ids}
+        self.dropped = {stream_id: 0 for stream_id in self.stream_ids}
+
+        # frames without a timestamp are stamped by their index in the stream, dropped ones included
+        self.dt = dt
+        self.frame_nums = {stream_id: 0 for stream_id in self.stream_ids}
+
+        # streams are spread over the workers in turn, no worker means tracking in this process
+        tracker_args = (dt, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz, gate)
+        self.trackers = None
+        self.connections, self.workers, self.busy = [], [], []
+        self.streams_of = [self.stream_ids[w::self.worker_num] for w in range(self.worker_num)]
+        if self.worker_num == 0:
+            self.trackers = {stream_id: tracker_utils.MultipleTargetTracker(*tracker_args, **kwargs)
+                             for stream_id in self.stream_ids}
+        for w in range(self.worker_num):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=run_pool_worker, args=(worker_connection, self.streams_of[w], tracker_args, kwargs),
+                daemon=True)
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+            self.busy.append(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, stream_id, detections, timestamp=None):
+        queue = self.pending[stream_id]
+        if len(queue) == queue.maxlen:
+            self.dropped[stream_id] += 1
+        if timestamp is None:
+            timestamp = self.frame_nums[stream_id] * self.dt
+        self.frame_nums[stream_id] += 1
+        queue.append((np.asarray(detections, dtype=float).reshape(-1, 6), timestamp))
+
+    def pop_frames(self, stream_ids):
+        frames = {}
+        for stream_id in stream_ids:
+            if len(self.pending[stream_id]) > 0:
+                frames[stream_id] = list(self.pending[stream_id])
+                self.pending[stream_id].clear()
+        return frames
+
+    def step(self, frames=None, timeout=None, timestamps=None):
+        # frames: stream id -> [M, 6] detections, timestamps: stream id -> timestamp of the frame,
+        # returns stream id -> confirmed tracks of the streams finished in time
+        if frames is not None:
+            for stream_id, detections in frames.items():
+                self.submit(stream_id, detections, None if timestamps is None else timestamps.get(stream_id))
+        if self.trackers is not None:
+            return process_frames(self.trackers, self.pop_frames(self.stream_ids))
+
+        results = {}
+        for w, connection in enumerate(self.connections):
+            if self.busy[w] and connection.poll():
+                results.update(connection.recv())
+                self.busy[w] = False
+            if not self.busy[w]:
+                batch = self.pop_frames(self.streams_of[w])
+                if len(batch) > 0:
+                    connection.send(('frames', batch))
+                    self.busy[w] = True
+
+        # streams whose worker misses the deadline are collected by a later step
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for w, connection in enumerate(self.connections):
+            if self.busy[w]:
+                remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                if connection.poll(remaining):
+                    results.update(connection.recv())
+                    self.busy[w] = False
+        return results
+
+    def close(self):
+        for w, (connection, worker) in enumerate(zip(self.connections, self.workers)):
+            if worker.is_alive():
+                if self.busy[w]:
+                    connection.recv()
+                connection.send(('stop',))
+                worker.join()
+            connection.close()
+        self.connections, self.workers, self.busy = [], [], []
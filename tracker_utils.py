@@ -1,7 +1,46 @@
+import heapq
+import time
+
+import numpy as np
+
+import association_utils
 import kalman_filter_utils
 
 
+# confirmed tracks as returned by the array interface
+TRACK_DTYPE = np.dtype([('number', np.int64), ('state', np.float64, (6,)), ('shape', np.float64, (3,))])
+
+# the full state of tracked objects, used to move tracks between trackers
+TRACK_RECORD_DTYPE = np.dtype([
+    ('number', np.int64), ('xx', np.float64, (6,)), ('pp', np.float64, (6, 6)),
+    ('smoother_xx', np.float64, (6,)), ('smoother_pp', np.float64, (6, 6)), ('shape', np.float64, (3,)),
+    ('blind_update', np.int64), ('confirmed_times', np.int64), ('quality', np.float64)])
+
+# imm tracks also carry the states, covariances and probabilities of every model, which the combined state drops
+IMM_TRACK_RECORD_DTYPE = np.dtype(TRACK_RECORD_DTYPE.descr + [
+    ('model_xs', np.float64, (len(kalman_filter_utils.IMM_MODELS), 9)),
+    ('model_ps', np.float64, (len(kalman_filter_utils.IMM_MODELS), 9, 9)),
+    ('model_mu', np.float64, (len(kalman_filter_utils.IMM_MODELS),))])
+
+# the candidates of births, as raw locations and the times since their first and last detections
+CANDIDATE_DTYPE = np.dtype([
+    ('location', np.float64, (3,)), ('first_location', np.float64, (3,)),
+    ('elapsed', np.float64), ('span', np.float64), ('hit_num', np.int64), ('frame_num', np.int64)])
+
+# the header of a tracker snapshot, followed by the track records and the candidates,
+# model_num is the number of imm models in the records and 0 for constant velocity records
+SNAPSHOT_MAGIC = b'MTTS'
+SNAPSHOT_VERSION = 5
+SNAPSHOT_HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'), ('version', np.int32), ('model_num', np.int32), ('track_num', np.int64),
+    ('candidate_num', np.int64), ('tracked_num', np.int64), ('late_frame_num', np.int64),
+    ('last_timestamp', np.float64), ('ego_pose', np.float64, (4, 4))])
+
+
 class Object():
+    __slots__ = ['x0', 'y0', 'z0', 'l0', 'w0', 'h0', 'vx', 'vy', 'vz', 'number', 'color',
+                 'tracker', 'tracker_blind_update', 'tracker_confirmed_times', 'smoother', 'quality']
+
     def __init__(self, x0=None, y0=None, z0=None, l0=None, w0=None, h0=None):
         self.x0 = x0
         self.y0 = y0
@@ -21,9 +60,11 @@ class Object():
         self.tracker_blind_update = None
         self.tracker_confirmed_times = None
 
-        self.smoother_l0 = None
-        self.smoother_w0 = None
-        self.smoother_h0 = None
+        # one filter smooths length, width and height together
+        self.smoother = None
+
+        # the log likelihood ratio of the track against clutter, accumulated over all frames
+        self.quality = 0.0
 
     def get_location(self):
         return self.x0, self.y0, self.z0
@@ -52,12 +93,8 @@ class Object():
             self.vx = vx
             self.vy = vy
             self.vz = vz
-        if self.smoother_l0 is not None:
-            self.l0 = self.smoother_l0.get_location()
-        if self.smoother_w0 is not None:
-            self.w0 = self.smoother_w0.get_location()
-        if self.smoother_h0 is not None:
-            self.h0 = self.smoother_h0.get_location()
+        if self.smoother is not None:
+            self.l0, self.w0, self.h0 = self.smoother.get_location()
 
     def limit_shape(self, min_size, max_size):
         self.l0 = min_size if self.l0 < min_size else self.l0
@@ -67,28 +104,61 @@ class Object():
         self.h0 = min_size if self.h0 < min_size else self.h0
         self.h0 = max_size if self.h0 > max_size else self.h0
 
-    def make_tracker_predict(self):
-        self.tracker.predict()
-        if self.smoother_l0 is not None:
-            self.smoother_l0.predict()
-        if self.smoother_w0 is not None:
-            self.smoother_w0.predict()
-        if self.smoother_h0 is not None:
-            self.smoother_h0.predict()
+    def make_tracker_predict(self, dt=None):
+        self.tracker.predict(dt)
+        self.make_smoother_predict(dt)
 
     def make_tracker_update(self, zx, zy, zz, zl=None, zw=None, zh=None):
         self.tracker.update(zx, zy, zz)
-        if zl is not None and self.smoother_l0 is not None:
-            self.smoother_l0.update(zl)
-        if zw is not None and self.smoother_w0 is not None:
-            self.smoother_w0.update(zw)
-        if zh is not None and self.smoother_h0 is not None:
-            self.smoother_h0.update(zh)
+        self.make_smoother_update(zl, zw, zh)
+
+    def make_smoother_predict(self, dt=None):
+        if self.smoother is not None:
+            self.smoother.predict(dt)
+
+    def make_smoother_update(self, zl=None, zw=None, zh=None):
+        if zl is not None and zw is not None and zh is not None and self.smoother is not None:
+            self.smoother.update(zl, zw, zh)
+
+
+class FrameReorderBuffer():
+    def __init__(self, delay, capacity=16):
+        # frames are held until a frame newer by delay arrives, the oldest one is released early when full
+        self.delay = delay
+        self.capacity = capacity
+        self.frames = []  # heap of (timestamp, sequence, frame)
+        self.sequence = 0
+        self.latest = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, timestamp, frame):
+        heapq.heappush(self.frames, (timestamp, self.sequence, frame))
+        self.sequence += 1
+        self.latest = timestamp if self.latest is None else max(self.latest, timestamp)
+        released = []
+        while len(self.frames) > 0 and (self.frames[0][0] <= self.latest - self.delay or
+                                        len(self.frames) > self.capacity):
+            timestamp, _, frame = heapq.heappop(self.frames)
+            released.append((timestamp, frame))
+        return released
+
+    def flush(self):
+        released = []
+        while len(self.frames) > 0:
+            timestamp, _, frame = heapq.heappop(self.frames)
+            released.append((timestamp, frame))
+        return released
 
 
 class MultipleTargetTracker():
     def __init__(self, dt, sigma_ax=1, sigma_ay=1, sigma_az=1, sigma_ox=1, sigma_oy=1, sigma_oz=1,
-                 gate=10, blind_update_limit=5, confirmation_thresh=5, min_size=1.0, max_size=10.0):
+                 gate=10, blind_update_limit=5, confirmation_thresh=5, min_size=1.0, max_size=10.0,
+                 filter_bank=False, association='greedy', gating='euclidean', chi2_gate=11.34, metrics=None,
+                 reorder_delay=None, reorder_capacity=16, recorder=None, motion_model='cv',
+                 detection_prob=0.9, clutter_density=1e-3, max_hypotheses=10000, birth_hits=2, birth_frames=2,
+                 track_budget=None, latency_budget=None, shed_callback=None):
         self.dt = dt
         self.sigma_ax = sigma_ax
         self.sigma_ay = sigma_ay
@@ -103,10 +173,83 @@ class MultipleTargetTracker():
         self.min_size = min_size
         self.max_size = max_size
 
-        self.objs_temp = []
+        if association == 'greedy':
+            self.associate = association_utils.associate_greedy
+        elif association == 'global':
+            self.associate = association_utils.associate_global
+        elif association == 'jpda':
+            # tracks are associated probabilistically, the candidates of births are still matched greedily
+            self.associate = association_utils.associate_greedy
+        else:
+            raise ValueError('Unknown association mode: %s' % association)
+        if association == 'jpda' and (not filter_bank or motion_model != 'cv'):
+            raise ValueError('JPDA association requires filter_bank=True and the cv motion model')
+        self.association = association
+        self.detection_prob = detection_prob
+        self.clutter_density = clutter_density  # the density of false detections, per cubic meter
+        self.max_hypotheses = max_hypotheses  # larger clusters fall back to the cheap jpda approximation
+        self.association_pairs = None
+
+        # the mahalanobis gate is a chi-square threshold on 3 degrees of freedom, 11.34 keeps 99%
+        if gating not in ['euclidean', 'mahalanobis']:
+            raise ValueError('Unknown gating mode: %s' % gating)
+        if gating == 'mahalanobis' and not filter_bank:
+            raise ValueError('Mahalanobis gating requires filter_bank=True')
+        self.gating = gating
+        self.chi2_gate = chi2_gate
+
+        # the imm model mixes constant velocity, constant acceleration and coordinated turn filters
+        if motion_model not in ['cv', 'imm']:
+            raise ValueError('Unknown motion model: %s' % motion_model)
+        if motion_model == 'imm' and not filter_bank:
+            raise ValueError('IMM motion model requires filter_bank=True')
+        self.motion_model = motion_model
+        self.record_dtype = IMM_TRACK_RECORD_DTYPE if motion_model == 'imm' else TRACK_RECORD_DTYPE
+
+        # a metrics_utils.TrackerMetrics to record every frame, None disables the instrumentation
+        self.metrics = metrics
+
+        # a recorder_utils.TrackRecorder to log the state after every frame, None disables the recording
+        self.recorder = recorder
+
+        # timestamped frames are predicted over the elapsed time, frames older than the last one are dropped
+        self.frame_dt = dt
+        self.last_timestamp = None
+        self.late_frame_num = 0
+        self.reorder_buffer = None
+        if reorder_delay is not None:
+            self.reorder_buffer = FrameReorderBuffer(reorder_delay, reorder_capacity)
+
+        # tracks stay in the sensor frame, which moves with the ego pose of the last frame
+        self.ego_pose = None
+
+        # a candidate is born once it is detected birth_hits times within birth_frames frames
+        if not 2 <= birth_hits <= birth_frames:
+            raise ValueError('Births require 2 <= birth_hits <= birth_frames')
+        self.birth_hits = birth_hits
+        self.birth_frames = birth_frames
+
+        # the lowest scored tentative tracks are shed when there are more than track_budget tracks,
+        # or when a frame takes longer than latency_budget seconds, every shedding is passed to shed_callback
+        self.track_budget = track_budget
+        self.latency_budget = latency_budget
+        self.shed_callback = shed_callback
+        self.track_limit = track_budget
+        self.refused_birth_num = 0
+
+        self.candidates = np.zeros(0, dtype=CANDIDATE_DTYPE)
         self.objs = []
         self.tracked_num = 0
 
+        # all tracked objects share one batched filter if enabled, self.objs[j] is row j of the bank
+        self.bank = None
+        if filter_bank and motion_model == 'imm':
+            self.bank = kalman_filter_utils.IMMFilterBank6D(
+                dt, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+        elif filter_bank:
+            self.bank = kalman_filter_utils.KalmanFilterBank6D(
+                dt, sigma_ax, sigma_ay, sigma_az, sigma_ox, sigma_oy, sigma_oz)
+
     def find_nearest_object(self, obj, objs_observed):
         flag, idx, ddm = False, 0, float('inf')
         for k in range(len(objs_observed)):
@@ -117,58 +260,445 @@ class MultipleTargetTracker():
                 flag, idx, ddm = True, k, dd
         return flag, idx, ddm
 
-    def update_objects(self, inputs):
-        # associate and track
-        objs_observed = inputs.copy()
+    def get_two_point_covariance(self):
+        # the covariance of a state initialized from the difference of two observations
+        pp = np.zeros((6, 6))
+        for k, sigma in enumerate([self.sigma_ox, self.sigma_oy, self.sigma_oz]):
+            r = sigma ** 2
+            dt = self.frame_dt
+            pp[2 * k:2 * k + 2, 2 * k:2 * k + 2] = [[r, r / dt], [r / dt, 2 * r / dt ** 2]]
+        return pp
+
+    def set_timestamp(self, timestamp):
+        if timestamp is None:
+            self.frame_dt = self.dt
+            return True
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            self.late_frame_num += 1
+            return False
+
+        # intervals equal to dt up to the microsecond use the matrices built at construction
+        dt = self.dt if self.last_timestamp is None else timestamp - self.last_timestamp
+        key = kalman_filter_utils.get_dt_key
+        self.frame_dt = self.dt if key(dt) == key(self.dt) else dt
+        self.last_timestamp = timestamp
+        return True
+
+    def set_ego_pose(self, ego_pose):
+        # ego_pose: [4, 4] transform from the sensor frame to a fixed world frame, None keeps the tracks in place
+        if ego_pose is None:
+            return
+        ego_pose = np.asarray(ego_pose, dtype=float).reshape(4, 4)
+        if self.ego_pose is not None:
+            self.transform_objects(np.linalg.solve(ego_pose, self.ego_pose))
+        self.ego_pose = ego_pose
+
+    def transform_objects(self, transform):
+        # transform: [4, 4] rigid transform from the previous sensor frame to the current one
+        rotation, translation = transform[:3, :3], transform[:3, 3]
+        if self.bank is not None:
+            self.bank.transform(rotation, translation)
+        elif len(self.objs) > 0:
+            # the separate filters are gathered, moved at once and scattered back
+            aa, offset = kalman_filter_utils.get_frame_transform(rotation, translation)
+            xx = np.stack([obj.tracker.xx for obj in self.objs]).astype(float)  # [N, 6, 1]
+            pp = np.stack([obj.tracker.pp for obj in self.objs]).astype(float)  # [N, 6, 6]
+            xx = aa @ xx + offset.reshape(6, 1)
+            pp = aa @ pp @ aa.T
+            for j, obj in enumerate(self.objs):
+                obj.tracker.xx, obj.tracker.pp = xx[j], pp[j]
+        for name in ['location', 'first_location']:
+            self.candidates[name] = self.candidates[name] @ rotation.T + translation
+
+    def predict_objects(self):
+        dt = self.frame_dt
+        if self.bank is not None:
+            self.bank.predict(dt=dt)
+        for j in range(len(self.objs)):
+            if self.bank is None:
+                self.objs[j].tracker.predict(dt)
+            self.objs[j].make_smoother_predict(dt)
+
+    def get_association_inputs(self):
+        if self.gating == 'mahalanobis':
+            # gate with the predicted innovation covariances, which the bank reuses in its update
+            _, ss_inv = self.bank.compute_innovation()
+            return self.bank.get_locations(), self.chi2_gate ** 0.5, ss_inv
+        return self.get_tracker_locations(self.objs), self.gate, None
+
+    def associate_objects(self, grid):
+        locations, gate, ss_inv = self.get_association_inputs()
+        if self.association == 'jpda':
+            # the most probable detections drive the counters, all gated pairs drive the filters
+            ss, ss_inv = self.bank.compute_innovation()
+            indices, (tracks, dets, weights) = association_utils.associate_jpda(
+                locations, grid, gate, ss, ss_inv, self.gating == 'mahalanobis',
+                self.detection_prob, self.clutter_density, self.max_hypotheses)
+            self.association_pairs = (tracks, grid.locations[dets], weights)
+            return indices
+        return self.associate(locations, grid, gate, ss_inv)
+
+    def score_objects(self, boxes):
+        # the log likelihood ratio of a detection from the track against one from clutter, or of a miss
+        scores = np.full(len(self.objs), np.log(1 - self.detection_prob))
+        hits = [j for j in range(len(self.objs)) if boxes[j] is not None]
+        if len(hits) == 0:
+            return scores
+        if self.bank is not None:
+            ss, ss_inv = self.bank.compute_innovation()
+            ss, ss_inv, locations = ss[hits], ss_inv[hits], self.bank.get_locations()[hits]
+        else:
+            tracker = self.objs[0].tracker
+            pp = np.stack([self.objs[j].tracker.pp for j in hits])  # [K, 6, 6]
+            ss = tracker.hh @ pp @ tracker.hh.T + tracker.noise_r
+            ss_inv = np.linalg.inv(ss)
+            locations = self.get_tracker_locations([self.objs[j] for j in hits])
+        zz = np.array([boxes[j][:3] for j in hits]) - locations  # [K, 3]
+        dd = np.einsum('ka,kab,kb->k', zz, ss_inv, zz)
+        _, logdet = np.linalg.slogdet(ss)
+        scores[hits] = np.log(self.detection_prob / self.clutter_density) - 0.5 * (3 * np.log(2 * np.pi) + logdet + dd)
+        return scores
+
+    def correct_objects(self, boxes, pairs=None):
+        # pairs: the tracks, locations and probabilities of the gated pairs under jpda
+        scores = self.score_objects(boxes)
+        if self.bank is not None and pairs is not None:
+            self.bank.update_weighted(*pairs)
+        elif self.bank is not None:
+            indices = [j for j in range(len(self.objs)) if boxes[j] is not None]
+            zs = [boxes[j][:3] for j in range(len(self.objs)) if boxes[j] is not None]
+            self.bank.update(indices, zs)
+
         for j in range(len(self.objs)):
-            flag, idx, _ = self.find_nearest_object(self.objs[j], objs_observed)
-            if flag:
-                zx, zy, zz, zl, zw, zh = objs_observed[idx].get_box()
-                self.objs[j].make_tracker_predict()
-                self.objs[j].make_tracker_update(zx, zy, zz, zl, zw, zh)
+            self.objs[j].quality += scores[j]
+            if boxes[j] is not None:
+                zx, zy, zz, zl, zw, zh = boxes[j]
+                if self.bank is None:
+                    self.objs[j].tracker.update(zx, zy, zz)
+                self.objs[j].make_smoother_update(zl, zw, zh)
                 self.objs[j].tracker_blind_update -= 1 if self.objs[j].tracker_blind_update > 0 else 0
                 self.objs[j].tracker_confirmed_times += 1
-                objs_observed.pop(idx)
             else:
-                self.objs[j].make_tracker_predict()
                 self.objs[j].tracker_blind_update += 1
                 self.objs[j].tracker_confirmed_times -= 1 if self.objs[j].tracker_confirmed_times > 0 else 0
             self.objs[j].update_state_from_tracker()
             self.objs[j].limit_shape(min_size=self.min_size, max_size=self.max_size)
 
+    def delete_objects(self):
+        keep = [obj.tracker_blind_update <= self.blind_update_limit for obj in self.objs]
+        return len(self.remove_objects(keep))
+
+    def remove_objects(self, keep):
+        if self.bank is not None:
+            self.bank.remove(keep)
+        objs_removed = [obj for obj, k in zip(self.objs, keep) if not k]
+        self.objs = [obj for obj, k in zip(self.objs, keep) if k]
+        return objs_removed
+
+    def get_birth_room(self):
+        # a birth starts from zero quality, so it may take the place of a tentative track scored below zero
+        room = self.track_limit - len(self.objs)
+        room += sum(obj.tracker_confirmed_times < self.confirmation_thresh and obj.quality < 0 for obj in self.objs)
+        return max(room, 0)
+
+    def shed_objects(self, frame_time):
+        # the tracks beyond the limit are shed, and the births of the next frame are capped by it
+        num = len(self.objs)
+        limit, reason = self.track_budget, 'track_budget'
+        if self.latency_budget is not None:
+            # the cost of a frame grows with the tracks, so the limit follows the ratio of the budget to the latency
+            latency_limit = int(max(num, 1) * self.latency_budget / frame_time)
+            if limit is None or latency_limit < limit:
+                limit, reason = latency_limit, 'latency_budget'
+        self.track_limit = limit
+        refused_num, self.refused_birth_num = self.refused_birth_num, 0
+        candidate_num = len(self.candidates)
+        if num <= limit and candidate_num <= limit and refused_num == 0:
+            return 0
+
+        # confirmed tracks are never shed, tentative ones are shed from the lowest quality
+        tentative = np.array([j for j in range(num) if self.objs[j].tracker_confirmed_times < self.confirmation_thresh],
+                             dtype=np.int64)
+        qualities = np.array([self.objs[j].quality for j in tentative], dtype=float)
+        keep = np.ones(num, dtype=bool)
+        keep[tentative[np.argsort(qualities, kind='stable')[:max(num - limit, 0)]]] = False
+        objs_shed = self.remove_objects(keep) if not keep.all() else []
+
+        # candidates are less certain than any track, the ones detected once are downsampled evenly
+        if candidate_num > limit:
+            multiple = np.flatnonzero(self.candidates['hit_num'] > 1)[:limit]
+            single = np.flatnonzero(self.candidates['hit_num'] == 1)
+            single = single[np.linspace(0, len(single), limit - len(multiple), endpoint=False).astype(np.int64)]
+            self.candidates = self.candidates[np.sort(np.concatenate([multiple, single]))]
+
+        if self.shed_callback is not None:
+            self.shed_callback(dict(
+                reason=reason, timestamp=self.last_timestamp, frame_time=frame_time, track_num=num, track_limit=limit,
+                numbers=[obj.number for obj in objs_shed], qualities=[obj.quality for obj in objs_shed],
+                refused_birth_num=refused_num, shed_candidate_num=candidate_num - len(self.candidates)))
+        return len(objs_shed)
+
+    def export_objects(self, objs):
+        records = np.zeros(len(objs), dtype=self.record_dtype)
+        fields = records[list(TRACK_RECORD_DTYPE.names)]
+        for j in range(len(objs)):
+            fields[j] = (objs[j].number, np.reshape(objs[j].tracker.xx, 6), objs[j].tracker.pp,
+                          objs[j].smoother.xx.reshape(6), objs[j].smoother.pp, objs[j].get_shape(),
+                          objs[j].tracker_blind_update, objs[j].tracker_confirmed_times, objs[j].quality)
+            if self.motion_model == 'imm':
+                bank, idx = objs[j].tracker.bank, objs[j].tracker.idx
+                records['model_xs'][j] = bank.buffer_xs[idx]
+                records['model_ps'][j] = bank.buffer_ps[idx]
+                records['model_mu'][j] = bank.buffer_mu[idx]
+        return records
+
+    def import_objects(self, records):
+        for record in records:
+            obj = Object()
+            obj.number = int(record['number'])
+            if self.motion_model == 'imm':
+                obj.tracker = self.bank.add(*record['xx'], pp=record['pp'], xs=record['model_xs'],
+                                            ps=record['model_ps'], mu=record['model_mu'])
+            elif self.bank is not None:
+                obj.tracker = self.bank.add(*record['xx'], pp=record['pp'])
+            else:
+                obj.tracker = kalman_filter_utils.KalmanFilter6D(
+                    self.dt, *record['xx'],
+                    self.sigma_ax, self.sigma_ay, self.sigma_az, self.sigma_ox, self.sigma_oy, self.sigma_oz)
+                obj.tracker.pp = record['pp'].copy()
+            obj.smoother = kalman_filter_utils.FastKalmanFilter6D(self.dt, *record['smoother_xx'])
+            obj.smoother.pp[:] = record['smoother_pp']
+            obj.tracker_blind_update = int(record['blind_update'])
+            obj.tracker_confirmed_times = int(record['confirmed_times'])
+            obj.quality = float(record['quality'])
+            obj.update_state_from_tracker()
+            obj.l0, obj.w0, obj.h0 = record['shape']
+            self.objs.append(obj)
+
+        # keep the tracking list in the order of numbers, as births append it
+        order = sorted(range(len(self.objs)), key=lambda j: self.objs[j].number)
+        if self.bank is not None:
+            self.bank.reorder(order)
+        self.objs = [self.objs[j] for j in order]
+
+    def load_state(self, records, candidates, tracked_num, last_timestamp=None, ego_pose=None):
+        # replace all tracks and candidates, the counters continue from the loaded ones
+        self.remove_objects([False] * len(self.objs))
+        self.import_objects(records)
+        self.candidates = np.array(candidates, dtype=CANDIDATE_DTYPE)
+        self.tracked_num = tracked_num
+        self.last_timestamp = last_timestamp
+        self.ego_pose = None if ego_pose is None else np.array(ego_pose, dtype=float).reshape(4, 4)
+
+    def snapshot(self):
+        records = self.export_objects(self.objs)
+        candidates = self.candidates
+        header = np.zeros(1, dtype=SNAPSHOT_HEADER_DTYPE)
+        model_num = len(kalman_filter_utils.IMM_MODELS) if self.motion_model == 'imm' else 0
+        header[0] = (SNAPSHOT_MAGIC, SNAPSHOT_VERSION, model_num, len(records), len(candidates), self.tracked_num,
+                     self.late_frame_num, np.nan if self.last_timestamp is None else self.last_timestamp,
+                     np.nan if self.ego_pose is None else self.ego_pose)
+        return b''.join([header.tobytes(), records.tobytes(), candidates.tobytes()])
+
+    def restore(self, buffer):
+        header = np.frombuffer(buffer, dtype=SNAPSHOT_HEADER_DTYPE, count=1)[0]
+        if header['magic'] != SNAPSHOT_MAGIC or header['version'] != SNAPSHOT_VERSION:
+            raise ValueError('Not a tracker snapshot of version %d' % SNAPSHOT_VERSION)
+        if header['model_num'] != (len(kalman_filter_utils.IMM_MODELS) if self.motion_model == 'imm' else 0):
+            raise ValueError('The snapshot was taken with another motion model')
+        track_num, candidate_num = int(header['track_num']), int(header['candidate_num'])
+        offset = SNAPSHOT_HEADER_DTYPE.itemsize
+        records = np.frombuffer(buffer, dtype=self.record_dtype, count=track_num, offset=offset)
+        offset += records.nbytes
+        candidates = np.frombuffer(buffer, dtype=CANDIDATE_DTYPE, count=candidate_num, offset=offset)
+        last_timestamp = None if np.isnan(header['last_timestamp']) else float(header['last_timestamp'])
+        ego_pose = None if np.isnan(header['ego_pose']).any() else header['ego_pose']
+        self.load_state(records, candidates, int(header['tracked_num']), last_timestamp, ego_pose)
+        self.late_frame_num = int(header['late_frame_num'])
+
+    def augment_objects(self, observed, grid):
+        num = len(self.objs)
+        self.advance_candidates()
+        indices = self.associate(self.get_candidate_locations(), grid, self.gate)
+        self.update_candidates(observed, indices)
+        return len(self.objs) - num
+
+    def advance_candidates(self):
+        dt = self.frame_dt
+        self.candidates['elapsed'] += dt
+        self.candidates['span'] += dt
+        self.candidates['frame_num'] += 1
+
+    def get_candidate_locations(self):
+        # candidates detected more than once move on at the velocity between their first and last detections
+        candidates = self.candidates
+        locations = candidates['location'].copy()  # [K, 3]
+        moving = candidates['hit_num'] > 1
+        if np.any(moving):
+            c = candidates[moving]
+            duration = (c['span'] - c['elapsed'])[:, None]
+            locations[moving] += (c['location'] - c['first_location']) / duration * c['elapsed'][:, None]
+        return locations
+
+    def get_birth_velocities(self, candidates, zs):
+        # two point initialization from the last detection, or from the first one after more hits
+        twice = (candidates['hit_num'] == 1)[:, None]
+        return np.where(twice, (zs - candidates['location']) / candidates['elapsed'][:, None],
+                        (zs - candidates['first_location']) / candidates['span'][:, None])
+
+    def update_candidates(self, observed, indices, numbers=None):
+        # indices: the detection matched to every candidate or -1, numbers: the numbers of births if given
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        candidates = self.candidates
+        matched = indices >= 0
+        ready = matched & (candidates['hit_num'] + 1 >= self.birth_hits)
+        refused = np.zeros(len(candidates), dtype=bool)
+        if self.track_limit is not None:
+            # births over the limit are refused, they stay candidates at their detections and are born later
+            refused[np.flatnonzero(ready)[self.get_birth_room():]] = True
+            ready &= ~refused
+            self.refused_birth_num += int(refused.sum())
+
+        # only the candidates which are born get filters
+        boxes = observed[indices[ready]]
+        velocities = self.get_birth_velocities(candidates[ready], boxes[:, :3])
+        numbers = [None] * len(boxes) if numbers is None else np.asarray(numbers)[ready]
+        for box, velocity, number in zip(boxes, velocities, numbers):
+            self.promote_object(box, velocity, number)
+
+        # the others move to their detections, and are dropped when they can not reach birth_hits in time
+        hit = matched & ~ready
+        candidates['location'][hit] = observed[indices[hit], :3]
+        candidates['elapsed'][hit] = 0
+        candidates['hit_num'][hit] += 1
+        reachable = candidates['hit_num'] + self.birth_frames - candidates['frame_num'] - 1 >= self.birth_hits
+        self.candidates = candidates[~ready & (refused | reachable)]
+
+    def add_candidates(self, observed, remained):
+        added = np.zeros(len(remained), dtype=CANDIDATE_DTYPE)
+        added['location'] = observed[remained, :3]
+        added['first_location'] = observed[remained, :3]
+        added['hit_num'] = 1
+        self.candidates = np.concatenate([self.candidates, added])
+
+    def promote_object(self, box, velocity, number=None):
+        zx, zy, zz, zl, zw, zh = box
+        vx, vy, vz = velocity
+        obj = Object()
+        if number is None:
+            self.tracked_num += 1
+            number = self.tracked_num
+        obj.number = int(number)
+        obj.tracker_blind_update = 0
+        obj.tracker_confirmed_times = 0
+        obj.smoother = kalman_filter_utils.FastKalmanFilter6D(self.dt, zl, 0, zw, 0, zh, 0)
+        if self.bank is not None:
+            pp = self.get_two_point_covariance() if self.gating == 'mahalanobis' else None
+            obj.tracker = self.bank.add(zx, vx, zy, vy, zz, vz, pp=pp)
+        else:
+            obj.tracker = kalman_filter_utils.KalmanFilter6D(
+                self.dt, zx, vx, zy, vy, zz, vz,
+                self.sigma_ax, self.sigma_ay, self.sigma_az, self.sigma_ox, self.sigma_oy, self.sigma_oz)
+        obj.update_state_from_tracker()
+        self.objs.append(obj)
+
+    def get_tracker_locations(self, objs):
+        if self.bank is not None and objs is self.objs:
+            return self.bank.get_locations()
+        return np.array([obj.tracker.get_location() for obj in objs]).reshape(-1, 3)
+
+    def update_objects(self, inputs, timestamp=None, ego_pose=None):
+        observed = np.array([obj.get_box() for obj in inputs], dtype=float).reshape(-1, 6)
+        self.update_detections(observed, timestamp, ego_pose)
+
+    def update_arrays(self, detections, timestamp=None, ego_pose=None):
+        self.update_detections(np.asarray(detections, dtype=float).reshape(-1, 6), timestamp, ego_pose)
+        return self.get_confirmed_array()
+
+    def track_stream(self, frames):
+        for detections in frames:
+            yield self.update_arrays(detections)
+
+    def update_detections(self, observed, timestamp=None, ego_pose=None):
+        # late frames wait in the reorder buffer if enabled, and are tracked in the order of timestamps
+        if timestamp is not None and self.reorder_buffer is not None:
+            for timestamp, (observed, ego_pose) in self.reorder_buffer.push(timestamp, (observed, ego_pose)):
+                self.track_detections(observed, timestamp, ego_pose)
+        else:
+            self.track_detections(observed, timestamp, ego_pose)
+
+    def flush_frames(self):
+        if self.reorder_buffer is not None:
+            for timestamp, (observed, ego_pose) in self.reorder_buffer.flush():
+                self.track_detections(observed, timestamp, ego_pose)
+
+    def track_detections(self, observed, timestamp=None, ego_pose=None):
+        # observed: [M, 6] array of x, y, z, l, w, h in the sensor frame, ego_pose: [4, 4] pose of the sensor
+        if not self.set_timestamp(timestamp):
+            return
+        t_start = time.perf_counter()
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin_frame()
+
+        # move the tracks and candidates into the current sensor frame before they are associated
+        if ego_pose is not None:
+            self.set_ego_pose(ego_pose)
+            if metrics is not None:
+                metrics.lap('ego')
+        grid = association_utils.UniformGrid(observed[:, :3], self.gate)
+        if metrics is not None:
+            metrics.lap('index')
+
+        # associate and track, mahalanobis gating and jpda need the predicted covariances
+        if self.gating == 'mahalanobis' or self.association == 'jpda':
+            self.predict_objects()
+            if metrics is not None:
+                metrics.lap('predict')
+            indices = self.associate_objects(grid)
+            if metrics is not None:
+                metrics.lap('associate')
+        else:
+            indices = self.associate_objects(grid)
+            if metrics is not None:
+                metrics.lap('associate')
+            self.predict_objects()
+            if metrics is not None:
+                metrics.lap('predict')
+        self.correct_objects([observed[idx] if idx >= 0 else None for idx in indices], self.association_pairs)
+        if metrics is not None:
+            metrics.lap('update')
+            pair_num = grid.pair_num
+
         # delete targets which are not updated for a long time
-        objs_remained = []
-        for j in range(len(self.objs)):
-            if self.objs[j].tracker_blind_update <= self.blind_update_limit:
-                objs_remained.append(self.objs[j])
-        self.objs = objs_remained
+        death_num = self.delete_objects()
+        if metrics is not None:
+            metrics.lap('delete')
 
         # augment the tracking list
-        for j in range(len(self.objs_temp)):
-            flag, idx, _ = self.find_nearest_object(self.objs_temp[j], objs_observed)
-            if flag:
-                zx, zy, zz, zl, zw, zh = objs_observed[idx].get_box()
-                x, y, z = self.objs_temp[j].tracker.get_location()
-                vx, vy, vz = (zx - x) / self.dt, (zy - y) / self.dt, (zz - z) / self.dt
-                self.objs_temp[j].tracker.set_state(zx, vx, zy, vy, zz, vz)
-                self.tracked_num += 1
-                self.objs_temp[j].number = self.tracked_num
-                self.objs_temp[j].tracker_blind_update = 0
-                self.objs_temp[j].tracker_confirmed_times = 0
-                self.objs_temp[j].smoother_l0 = kalman_filter_utils.KalmanFilter2D(self.dt, zl, 0, 1, 1)
-                self.objs_temp[j].smoother_w0 = kalman_filter_utils.KalmanFilter2D(self.dt, zw, 0, 1, 1)
-                self.objs_temp[j].smoother_h0 = kalman_filter_utils.KalmanFilter2D(self.dt, zh, 0, 1, 1)
-                self.objs_temp[j].update_state_from_tracker()
-                self.objs.append(self.objs_temp[j])
-                objs_observed.pop(idx)
-
-        # augment the temporary tracking list
-        self.objs_temp = objs_observed
-        for j in range(len(self.objs_temp)):
-            x0, vx, y0, vy, z0, vz = self.objs_temp[j].get_state()
-            self.objs_temp[j].tracker = kalman_filter_utils.KalmanFilter6D(
-                self.dt, x0, vx, y0, vy, z0, vz,
-                self.sigma_ax, self.sigma_ay, self.sigma_az, self.sigma_ox, self.sigma_oy, self.sigma_oz)
+        birth_num = self.augment_objects(observed, grid)
+        if metrics is not None:
+            metrics.lap('birth')
+
+        # keep the remaining detections as candidates
+        self.add_candidates(observed, np.flatnonzero(grid.alive))
+        if metrics is not None:
+            metrics.lap('candidate')
+
+        # shed tentative tracks under overload
+        shed_num = 0
+        if self.track_budget is not None or self.latency_budget is not None:
+            shed_num = self.shed_objects(time.perf_counter() - t_start)
+            if metrics is not None:
+                metrics.lap('shed')
+        if metrics is not None:
+            gate_hit_num = sum(idx >= 0 for idx in indices)
+            metrics.end_frame(
+                detection_num=len(observed), track_num=len(self.objs), candidate_num=len(self.candidates),
+                pair_num=pair_num, gate_hit_num=gate_hit_num, gate_miss_num=len(indices) - gate_hit_num,
+                birth_num=birth_num, death_num=death_num, shed_num=shed_num)
+        if self.recorder is not None:
+            self.recorder.record(self, observed, timestamp)
 
     def get_confirmed_objects(self):
         objs_confirmed = []
@@ -176,3 +706,10 @@ class MultipleTargetTracker():
             if self.objs[j].tracker_confirmed_times >= self.confirmation_thresh:
                 objs_confirmed.append(self.objs[j])
         return objs_confirmed
+
+    def get_confirmed_array(self):
+        objs = self.get_confirmed_objects()
+        tracks = np.zeros(len(objs), dtype=TRACK_DTYPE)
+        for j in range(len(objs)):
+            tracks[j] = objs[j].number, objs[j].get_state(), objs[j].get_shape()
+        return tracks